@@ -0,0 +1,268 @@
+import os
+import io
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+import contextlib
+import functools
+import pandas as pd
+import chatdb
+from chatdb import ChatDB
+
+# benchmark suite for ChatDB: times upload, sample display, query generation and query execution
+# over scaled-up copies of the bundled datasets, and writes the timings to a JSON file
+# usage: python benchmark.py --scales 1 10 100 --output results.json --compare old_results.json
+
+# bundled fixtures: (csv file, database type, dataset name)
+FIXTURES = [
+    ('sqldata/videogames.csv', 'sql', 'videogames'),
+    ('sqldata/books.csv', 'sql', 'books'),
+    ('mongodata/hbo.csv', 'mongo', 'hbo'),
+    ('mongodata/cars.csv', 'mongo', 'cars'),
+    ('mongodata/Original_data_with_more_rows.csv', 'mongo', 'students'),
+]
+
+# every fixture is benchmarked at each of these multiples of its row count
+DEFAULT_SCALES = [1, 10, 100]
+# seed for query generation, the same seed gives the same queries on every run
+DEFAULT_SEED = 42
+# each timed operation except upload runs this many times, the median is reported
+DEFAULT_REPEATS = 3
+# a comparison flags an operation as slower when its median grows by more than this fraction
+REGRESSION_THRESHOLD = 0.1
+# benchmark datasets get this prefix so they never overwrite the user's own tables/collections
+DATASET_PREFIX = 'bench_'
+
+
+# source: https://docs.python.org/3/library/contextlib.html#contextlib.redirect_stdout
+@contextlib.contextmanager
+def quiet():
+    # ChatDB prints everything it does, keep that out of the benchmark output
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def use_mongo_standin():
+    """Swaps the MongoDB client for mongomock so the mongo fixtures run without a mongod."""
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("--mongo-standin needs mongomock (pip install mongomock)")
+    chatdb.pymongo.MongoClient = mongomock.MongoClient
+    # the stand-in has no explain command, so the cost guard would only log errors
+    chatdb.EXPLAIN_BEFORE_EXECUTE = False
+    # ChatDB tags every read with a comment for killOp, mongomock refuses it on finds and counts
+    for name in ('find', 'count_documents', 'estimated_document_count'):
+        setattr(mongomock.Collection, name, without_comment(getattr(mongomock.Collection, name)))
+
+
+def without_comment(method):
+    @functools.wraps(method)
+    def call(self, *args, comment=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return call
+
+
+def scaled_copy(file_path, scale, directory):
+    """Writes the fixture repeated scale times to a temporary CSV and returns its path."""
+    if scale == 1:
+        return file_path
+    df = pd.read_csv(file_path)
+    path = os.path.join(directory, f"{scale}x_{os.path.basename(file_path)}")
+    pd.concat([df] * scale, ignore_index=True).to_csv(path, index=False)
+    return path
+
+
+def time_call(func, repeats):
+    # wall-clock time of every run in seconds
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with quiet():
+            func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(timings, **extra):
+    if not timings:
+        # nothing succeeded, so there is nothing to time
+        return dict(extra, runs=0, median_s=None, min_s=None, max_s=None)
+    return dict(
+        extra,
+        runs=len(timings),
+        median_s=statistics.median(timings),
+        min_s=min(timings),
+        max_s=max(timings)
+    )
+
+
+def count_rows(file_path):
+    # csv.reader, not a line count: quoted fields can span lines
+    with open(file_path, newline='', encoding='utf-8', errors='ignore') as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+def benchmark_fixture(db, file_path, db_type, dataset, scale, seed, repeats):
+    """Times every benchmarked operation on one fixture at one scale."""
+    results = {}
+    rows = count_rows(file_path)
+
+    # upload is timed once per scale, it drops and recreates the dataset
+    results['upload_csv'] = summarize(
+        time_call(lambda: db.upload_csv(file_path, dataset, db_type), 1), rows=rows
+    )
+
+    def sample():
+        # cold read: drop the cached schema so the sample comes from the database
+        db.invalidate_schema(dataset, db_type)
+        db.show_sample_data(dataset, db_type)
+    results['show_sample_data'] = summarize(time_call(sample, repeats))
+
+    # generation is seeded so every run (and every compared run) produces the same queries
+    queries = []
+    def generate():
+        random.seed(seed)
+        queries[:] = db.generate_query(dataset, db_type)
+    name = 'generate_sql_queries' if db_type in chatdb.SQL_ENGINES else 'generate_mongo_queries'
+    results[name] = summarize(time_call(generate, repeats), queries=len(queries))
+
+    # execute_query only prints its errors, so each query runs through fetch_query_summary
+    # and the failed, refused and timed out ones are counted instead of timed
+    latencies = []
+    outcomes = {'succeeded': 0, 'refused': 0, 'timed_out': 0, 'failed': 0}
+    errors = set()
+    for _ in range(repeats):
+        # cold run: cached results would only measure the cache
+        db.result_cache.clear()
+        for query in queries:
+            start = time.perf_counter()
+            try:
+                with quiet():
+                    db.render_query_summary(db.fetch_query_summary(query, dataset, db_type), db_type)
+            except chatdb.QueryRefusedError:
+                outcomes['refused'] += 1
+                continue
+            except chatdb.QueryTimeoutError:
+                outcomes['timed_out'] += 1
+                continue
+            except Exception as e:
+                outcomes['failed'] += 1
+                errors.add(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+            outcomes['succeeded'] += 1
+    # median/min/max are per successful query
+    results['execute_query'] = summarize(latencies, queries=len(queries), errors=sorted(errors), **outcomes)
+    return results
+
+
+def run_benchmarks(fixtures, scales, seed, repeats):
+    db = ChatDB()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for file_path, db_type, name in fixtures:
+            for scale in scales:
+                label = f"{name}@{scale}x"
+                print(f"Benchmarking {label} ({db_type})...")
+                path = scaled_copy(file_path, scale, directory)
+                try:
+                    for operation, summary in benchmark_fixture(
+                            db, path, db_type, f"{DATASET_PREFIX}{name}", scale, seed, repeats).items():
+                        results[f"{label}/{operation}"] = dict(summary, dataset=name, db_type=db_type, scale=scale)
+                        if summary.get('failed') or summary.get('refused') or summary.get('timed_out'):
+                            print(f"  {operation}: {summary['refused']} refused, {summary['timed_out']} timed out, "
+                                  f"{summary['failed']} failed (not timed)")
+                            for error in summary['errors']:
+                                print(f"    {error}")
+                except Exception as e:
+                    # one unreachable backend shouldn't lose the results of the other
+                    print(f"Error benchmarking {label}: {e}")
+    db.close()
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Prints the median of every operation next to the baseline run and flags regressions."""
+    print(f"\n{'operation':<50} {'before':>10} {'after':>10} {'change':>8}")
+    regressions = 0
+    for key, summary in results.items():
+        if key not in baseline:
+            after = '-' if summary['median_s'] is None else f"{summary['median_s']:.4f}"
+            print(f"{key:<50} {'-':>10} {after:>10} {'new':>8}")
+            continue
+        before, after = baseline[key]['median_s'], summary['median_s']
+        if before is None or after is None:
+            # one of the runs had no successful timings to compare
+            print(f"{key:<50} {before if before is not None else '-':>10} {after if after is not None else '-':>10} {'n/a':>8}")
+            continue
+        change = (after - before) / before if before else 0
+        flag = ''
+        if change > threshold:
+            flag = '  slower'
+            regressions += 1
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{key:<50} {before:>10.4f} {after:>10.4f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChatDB against the bundled datasets")
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help="row count multiples to benchmark")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="query generation seed")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help="runs per timed operation")
+    parser.add_argument('--db-type', choices=['sql', 'mongo'], help="only benchmark one backend")
+    parser.add_argument('--fixtures', nargs='+', help="only benchmark these datasets (e.g. hbo books)")
+    parser.add_argument('--sql-backend', choices=['sql', 'duckdb'], default='sql',
+                        help="run the sql fixtures on MySQL or in-process on the embedded duckdb backend")
+    parser.add_argument('--mongo-standin', action='store_true',
+                        help="run the mongo fixtures in-process on mongomock instead of a mongod")
+    parser.add_argument('--output', default='benchmark_results.json', help="where to write the results")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    if args.mongo_standin:
+        use_mongo_standin()
+
+    # fixture paths are relative to the repository
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    fixtures = [
+        fixture for fixture in FIXTURES
+        if (not args.db_type or fixture[1] == args.db_type) and (not args.fixtures or fixture[2] in args.fixtures)
+    ]
+    if args.sql_backend == 'duckdb':
+        fixtures = [(path, 'duckdb' if db_type == 'sql' else db_type, name) for path, db_type, name in fixtures]
+
+    results = run_benchmarks(fixtures, args.scales, args.seed, args.repeats)
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'scales': args.scales,
+        'repeats': args.repeats,
+        'sql_backend': args.sql_backend,
+        'mongo_standin': args.mongo_standin,
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'])
+        print(f"\n{regressions} operation(s) slower than {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,57 @@
+import time
+
+# startup timing starts before anything else is imported
+MODULE_LOAD_START = time.perf_counter()
+
+import argparse
+import functools
+import importlib.util
+import itertools
+import json
+import os
 import random
-import mysql.connector
-import pandas as pd
-from pymongo import MongoClient
+import re
+import sys
+import tempfile
+import threading
+import uuid
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict
 
+# seconds spent on startup steps: importing chatdb, each lazy import, reaching the first prompt
+STARTUP_TIMES = {}
+
+
+# pandas and the database drivers are heavy, they're only imported when first used
+# so a session that never touches a backend never loads its driver
+class LazyModule:
+    def __init__(self, name):
+        # like `import a.b`, the dotted module is imported but the top-level package is what we use
+        self.name = name
+        self.module = None
+
+    def load(self):
+        if self.module is None:
+            start = time.perf_counter()
+            self.module = __import__(self.name)
+            STARTUP_TIMES[f"import {self.name}"] = time.perf_counter() - start
+        return self.module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+mysql = LazyModule('mysql.connector.pooling')
+pymongo = LazyModule('pymongo')
+duckdb = LazyModule('duckdb')
+
+# duckdb is optional, the embedded backend is only offered when it is installed
+# (find_spec only looks for the package, it doesn't import it)
+DUCKDB_AVAILABLE = importlib.util.find_spec('duckdb') is not None
+
 # pre configured mysql connection
 # NOTE: if you want to use your own database, change these or the .env file
 # on the github repo
@@ -17,8 +65,665 @@ MYSQL_CONFIG = {
 }
 
 # connecting to default mongodb database and port
+MONGODB_URI = 'mongodb://localhost:27017'
 MONGODB_DATABASE = 'chatdbmongo'
 
+# embedded columnar database file for the 'duckdb' backend, no server needed
+# kept in the home directory so it doesn't depend on (or litter) the directory chatdb runs from
+DUCKDB_PATH = os.path.join(os.path.expanduser('~'), '.chatdb', 'chatdb.duckdb')
+# database types that run the SQL query templates
+SQL_ENGINES = ('sql', 'duckdb')
+# rows fetched at a time when reading a duckdb result
+DUCKDB_FETCH_SIZE = 2048
+
+# connection pooling settings
+# number of mysql connections kept open for the session
+MYSQL_POOL_SIZE = 5
+# maximum sockets the shared MongoClient keeps per server
+MONGO_POOL_SIZE = 10
+# seconds between health checks of the shared MongoClient
+MONGO_HEALTH_CHECK_INTERVAL = 30
+
+# number of leading rows/documents kept and printed for a query result
+RESULT_HEAD_ROWS = 8
+
+# run the generated query batch concurrently instead of one query after another
+CONCURRENT_QUERIES = True
+# cap on queries running at the same time against each backend
+MAX_CONCURRENT_QUERIES = {'sql': 5, 'mongo': 5, 'duckdb': 4}
+
+# max number of query results kept in the in-process LRU result cache
+RESULT_CACHE_SIZE = 128
+
+# timing spans around connections, catalog, sampling, generation, execution and rendering
+TRACE_ENABLED = True
+# most recent span events kept for the 'stats' command and the JSON lines export
+TRACE_MAX_EVENTS = 10000
+# default file for 'export traces'
+TRACE_EXPORT_PATH = 'chatdb_traces.jsonl'
+
+# placeholders in the sql templates that are filled with column names
+SQL_COLUMN_PARAMS = ('group_col', 'numeric_col', 'text_col', 'ord_col', 'ord_col1', 'ord_col2', 'col')
+
+# index advisor settings
+# build the likely indexes right after an upload
+AUTO_INDEX_ON_UPLOAD = False
+# most indexes created automatically for one upload
+MAX_UPLOAD_INDEXES = 4
+# recent distinct queries per dataset kept for measuring index savings
+INDEX_WORKLOAD_SIZE = 20
+# prefix length used when indexing TEXT columns and VARCHARs longer than this
+# (191 utf8mb4 characters fit the smallest InnoDB key limit, 767 bytes)
+TEXT_INDEX_PREFIX = 191
+
+# documents sampled on the server when profiling a collection's schema
+MONGO_SCHEMA_SAMPLE_SIZE = 1000
+# bson type names the query generators treat as numeric / text
+MONGO_NUMERIC_TYPES = ('int', 'long', 'double', 'decimal')
+MONGO_TEXT_TYPES = ('string',)
+
+# column statistics settings
+# table/collection holding per-column statistics computed at upload time
+COLUMN_STATS_TABLE = 'chatdb_column_stats'
+
+# a replace upload loads into <name>__staging and swaps it in when it's complete, so other
+# sessions never see a half-loaded dataset; the old data is <name>__retired until it's dropped
+STAGING_SUFFIX = '__staging'
+RETIRED_SUFFIX = '__retired'
+# quantiles stored for numeric columns
+STATS_QUANTILES = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+# most frequent values stored per column
+STATS_TOP_VALUES = 10
+# fraction of rows (or groups) generated filters should keep
+TARGET_SELECTIVITY = 0.1
+
+# workload generator settings
+# queries generated by 'generate workload' when no count is given
+WORKLOAD_SIZE = 1000
+# default seed, the same seed, dataset and mix give the same workload
+WORKLOAD_SEED = 42
+# parameters are drawn this many queries at a time
+WORKLOAD_BATCH_SIZE = 10000
+# relative weight of each query type, types left out are not generated
+SQL_WORKLOAD_MIX = {'group_by': 1, 'having': 1, 'order_by': 1, 'where': 1,
+                    'sum': 1, 'count': 1, 'avg': 1, 'aggregation': 1}
+MONGO_WORKLOAD_MIX = {'find': 1, 'find_criteria': 1, 'projection': 1,
+                      'aggregate': 1, 'group': 1, 'match': 1}
+# placeholder the mongo patterns are compiled with, bound to a value per query
+WORKLOAD_TOKEN = '<<{}>>'
+
+# replay (load test) settings
+# queries in flight at once
+REPLAY_CONCURRENCY = 4
+
+# per-query deadline in milliseconds (MAX_EXECUTION_TIME hint on MySQL, maxTimeMS on MongoDB)
+QUERY_TIMEOUT_MS = 30000
+# mysql error number for a statement stopped by MAX_EXECUTION_TIME
+MYSQL_QUERY_TIMEOUT_ERRNO = 3024
+
+# cost guard settings
+# EXPLAIN every query before it runs
+EXPLAIN_BEFORE_EXECUTE = True
+# queries estimated to examine more rows than this get a LIMIT or are refused
+MAX_QUERY_ROWS = 1000000
+# LIMIT added to row-returning queries over the cost limit
+GUARD_LIMIT = 1000
+# 'queryPlanner' only plans, 'executionStats' also runs the query to count documents examined
+MONGO_EXPLAIN_VERBOSITY = 'queryPlanner'
+
+# upload modes: replace drops and reloads the dataset, append only adds new rows,
+# upsert adds new rows and updates changed ones
+UPLOAD_MODES = ('replace', 'append', 'upsert')
+# per-row content hash stored with every upload, so append/upsert can skip unchanged rows
+ROW_HASH_COLUMN = '_row_hash'
+
+# seconds the dataset catalog (SHOW TABLES / list_collection_names) is reused before it is reloaded
+CATALOG_TTL = 300
+# seconds to wait for the backends to list their datasets, they are asked concurrently
+CATALOG_PROBE_TIMEOUT = 3
+# seconds a backend that missed the deadline is shown as unavailable before it is asked again
+CATALOG_RETRY_INTERVAL = 30
+# how long MongoClient looks for a server before failing, so a dead mongod doesn't stall for 30s
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+# display names of the backends
+BACKEND_NAMES = {'sql': 'MySQL', 'mongo': 'MongoDB', 'duckdb': 'DuckDB'}
+
+# column profiling settings for generate_create_table_stmt
+# text columns with at most this many distinct values are stored as ENUM
+ENUM_MAX_VALUES = 16
+# longest text kept in a VARCHAR, longer columns become TEXT
+VARCHAR_MAX_LENGTH = 1024
+# most decimal places stored exactly as DECIMAL before falling back to DOUBLE
+DECIMAL_MAX_SCALE = 4
+
+# numbers written with currency symbols and/or thousands separators, e.g. "101,200", "$1,299.99" or "1,000+"
+NUMERIC_TEXT_PATTERN = r'^\s*[<>~]?\s*-?\s*[$€£¥]?\s*-?(\d{1,3}(,\d{3})+|\d+)(\.\d+)?\s*\+?\s*$'
+# placeholders that mean "no value" inside an otherwise numeric text column
+MISSING_TEXT_VALUES = ('', '-', '--', 'N/A', 'n/a', 'NA', 'null', 'None')
+# dates MySQL can parse as-is
+ISO_DATE_PATTERN = r'^\d{4}-\d{2}-\d{2}$'
+ISO_DATETIME_PATTERN = r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2})?$'
+
+# bulk loading settings for upload_to_sql
+# number of rows sent per executemany call (the connector rewrites these into one multi-row INSERT)
+SQL_BATCH_SIZE = 1000
+# commit every N rows so big uploads don't sit in one huge transaction
+SQL_COMMIT_INTERVAL = 10000
+# try LOAD DATA LOCAL INFILE first (needs local_infile=ON on the server), batched inserts are the fallback
+SQL_USE_LOAD_DATA = False
+
+# streaming upload settings for upload_csv
+# memory budget (MB) used to size the csv chunks of a streaming upload
+STREAM_MEMORY_BUDGET_MB = 256
+# rows read up front to infer the schema that every chunk is held to
+STREAM_SAMPLE_ROWS = 10000
+# a chunk is copied a few times while being converted for the driver, so leave headroom
+STREAM_MEMORY_OVERHEAD = 4
+
+# bulk loading settings for upload_to_mongo
+# documents per unordered bulk_write call
+MONGO_BATCH_SIZE = 1000
+# number of batches written concurrently
+MONGO_WORKERS = 4
+
+# raised when the cost guard won't let a query reach the server
+class QueryRefusedError(Exception):
+    pass
+
+
+# raised when a query runs past its deadline, reported apart from other errors
+class QueryTimeoutError(Exception):
+    pass
+
+
+# keeps the database connections alive for the whole session
+# connect_mysql/connect_mongo hand out connections from here instead of opening new ones
+class ConnectionManager:
+    def __init__(self, pool_size=MYSQL_POOL_SIZE, mongo_pool_size=MONGO_POOL_SIZE):
+        self.pool_size = pool_size
+        self.mongo_pool_size = mongo_pool_size
+        self.mysql_pool = None
+        self.mongo_client = None
+        self.mongo_checked_at = 0
+        self.duckdb_conn = None
+        # one lock per backend, so a server that hangs while connecting doesn't hold up the others
+        self.mysql_lock = threading.Lock()
+        self.mongo_lock = threading.Lock()
+        self.duckdb_lock = threading.Lock()
+        # guards the stats counters
+        self.lock = threading.Lock()
+        # hits are requests served by an already open connection, misses had to open a new one
+        self.stats = {
+            'mysql_hits': 0,
+            'mysql_misses': 0,
+            'mysql_reconnects': 0,
+            'mongo_hits': 0,
+            'mongo_misses': 0,
+            'mongo_reconnects': 0,
+            'duckdb_hits': 0,
+            'duckdb_misses': 0
+        }
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    # source: https://dev.mysql.com/doc/connector-python/en/connector-python-connection-pooling.html
+    def mysql(self, **options):
+        # connections with extra options (e.g. allow_local_infile) are one-off and not pooled
+        if options:
+            self.count('mysql_misses')
+            return mysql.connector.connect(**{**MYSQL_CONFIG, **options})
+
+        with self.mysql_lock:
+            if self.mysql_pool is None:
+                # creating the pool opens all of its connections up front
+                self.mysql_pool = mysql.connector.pooling.MySQLConnectionPool(
+                    pool_name='chatdb', pool_size=self.pool_size, **MYSQL_CONFIG
+                )
+                for _ in range(self.pool_size):
+                    self.count('mysql_misses')
+
+        try:
+            cnx = self.mysql_pool.get_connection()
+        except mysql.connector.errors.PoolError:
+            # every pooled connection is busy, so open a one-off one rather than wait
+            self.count('mysql_misses')
+            return mysql.connector.connect(**MYSQL_CONFIG)
+
+        # health check: the server may have dropped an idle connection
+        if not cnx.is_connected():
+            cnx.reconnect(attempts=2, delay=0)
+            self.count('mysql_reconnects')
+        else:
+            self.count('mysql_hits')
+        return cnx
+
+    def new_mongo_client(self):
+        return pymongo.MongoClient(
+            MONGODB_URI, maxPoolSize=self.mongo_pool_size,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS
+        )
+
+    def mongo(self):
+        with self.mongo_lock:
+            if self.mongo_client is None:
+                # MongoClient keeps its own socket pool, so one client is shared by the session
+                self.mongo_client = self.new_mongo_client()
+                self.mongo_checked_at = time.monotonic()
+                self.count('mongo_misses')
+            elif time.monotonic() - self.mongo_checked_at > MONGO_HEALTH_CHECK_INTERVAL:
+                # health check: replace the client if the server stopped answering
+                try:
+                    self.mongo_client.admin.command('ping')
+                    self.count('mongo_hits')
+                except pymongo.errors.PyMongoError:
+                    self.mongo_client.close()
+                    self.mongo_client = self.new_mongo_client()
+                    self.count('mongo_reconnects')
+                self.mongo_checked_at = time.monotonic()
+            else:
+                self.count('mongo_hits')
+            return self.mongo_client[MONGODB_DATABASE]
+
+    # source: https://duckdb.org/docs/api/python/dbapi
+    def duckdb(self):
+        if not DUCKDB_AVAILABLE:
+            raise RuntimeError("the duckdb backend needs the duckdb package (pip install duckdb)")
+        with self.duckdb_lock:
+            if self.duckdb_conn is None:
+                # one handle on the database file for the session, connecting creates the file
+                if os.path.dirname(DUCKDB_PATH):
+                    os.makedirs(os.path.dirname(DUCKDB_PATH), exist_ok=True)
+                self.duckdb_conn = duckdb.connect(DUCKDB_PATH)
+                self.count('duckdb_misses')
+            else:
+                self.count('duckdb_hits')
+            # every caller gets its own cursor on the shared database, so threads don't share one
+            return self.duckdb_conn.cursor()
+
+    def release_mysql(self, cnx, discard=False):
+        # a connection left mid-result (failed or interrupted read) still has rows on the wire,
+        # so it is disconnected first and the pool reconnects it on its next use
+        if discard:
+            try:
+                getattr(cnx, '_cnx', cnx).disconnect()
+            except mysql.connector.Error:
+                pass
+        # a connection interrupted mid-result can fail to reset, the health check reconnects it later
+        try:
+            cnx.close()
+        except mysql.connector.Error:
+            pass
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def close(self):
+        # no backend locks here: a catalog probe stuck connecting would keep exit waiting
+        if self.mysql_pool is not None:
+            # the pool has no public close, this closes every idle pooled connection
+            self.mysql_pool._remove_connections()
+            self.mysql_pool = None
+        if self.mongo_client is not None:
+            self.mongo_client.close()
+            self.mongo_client = None
+        if self.duckdb_conn is not None:
+            self.duckdb_conn.close()
+            self.duckdb_conn = None
+
+
+# in-process LRU cache of query result summaries
+# keys include the dataset version, so re-uploading a dataset makes its old entries unreachable
+class ResultCache:
+    def __init__(self, max_size=RESULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                # mark as most recently used
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            # evict the least recently used entries
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': f"{(self.hits / lookups if lookups else 0):.1%}",
+                'entries': len(self.entries),
+                'max_size': self.max_size
+            }
+
+
+# records which columns the executed queries filter, group, sort and aggregate on
+# and turns that workload into index suggestions per dataset
+class IndexAdvisor:
+    def __init__(self, workload_size=INDEX_WORKLOAD_SIZE):
+        self.workload_size = workload_size
+        # (db_type, dataset) -> Counter of candidate index column tuples
+        self.candidates = {}
+        # (db_type, dataset) -> recent distinct queries, used to time before/after building
+        self.recent = {}
+        self.lock = threading.Lock()
+
+    def record(self, dataset_name, db_type, query, usage):
+        key = (db_type, dataset_name)
+        with self.lock:
+            counts = self.candidates.setdefault(key, Counter())
+            for columns in self.index_candidates(usage, db_type):
+                counts[columns] += 1
+
+            recent = self.recent.setdefault(key, [])
+            if query not in recent:
+                recent.append(query)
+                del recent[:-self.workload_size]
+
+    def index_candidates(self, usage, db_type):
+        # range filters and sorts can use a plain index on their column
+        candidates = [(col,) for col in usage['filter']]
+        if db_type == 'sql':
+            # (group column, aggregated column) covers a GROUP BY without reading the table rows
+            for col in usage['group']:
+                aggregated = [agg for agg in usage['aggregate'] if agg != col]
+                candidates.append((col, aggregated[0]) if aggregated else (col,))
+        # a mongo index doesn't speed up a $group over the whole collection, so group fields are skipped there
+        if usage['sort']:
+            candidates.append(tuple(dict.fromkeys(usage['sort'])))
+        return candidates
+
+    def suggestions(self, dataset_name, db_type):
+        # most used candidates first
+        with self.lock:
+            counts = self.candidates.get((db_type, dataset_name), Counter())
+            return counts.most_common()
+
+    def recent_queries(self, dataset_name, db_type):
+        with self.lock:
+            return list(self.recent.get((db_type, dataset_name), []))
+
+
+def percentile(sorted_values, pct):
+    # nearest-rank percentile of an already sorted list
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+# records how long each traced step takes, so a slow run can be broken down by step
+class Tracer:
+    def __init__(self, max_events=TRACE_MAX_EVENTS, enabled=TRACE_ENABLED):
+        self.enabled = enabled
+        # oldest events are dropped once max_events is reached
+        self.events = deque(maxlen=max_events)
+        self.lock = threading.Lock()
+        # per-thread stack of open spans, so each event knows its parent
+        self.local = threading.local()
+
+    def record(self, name, start, duration, parent):
+        event = {
+            'span': name,
+            'parent': parent,
+            'start': start,
+            'duration_ms': duration * 1000,
+            'thread': threading.current_thread().name
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def span(self, name):
+        return TraceSpan(self, name)
+
+    def get_stats(self):
+        """Returns {span: {'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'total_ms'}}."""
+        with self.lock:
+            durations = {}
+            for event in self.events:
+                durations.setdefault(event['span'], []).append(event['duration_ms'])
+        stats = {}
+        for name, values in durations.items():
+            values.sort()
+            stats[name] = {
+                'count': len(values),
+                'p50_ms': percentile(values, 50),
+                'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99),
+                'max_ms': values[-1],
+                'total_ms': sum(values)
+            }
+        return stats
+
+    def export(self, path):
+        # one JSON object per line, easy to load with pandas.read_json(path, lines=True)
+        with self.lock:
+            events = list(self.events)
+        with open(path, 'w') as f:
+            for event in events:
+                f.write(json.dumps(event) + '\n')
+        return len(events)
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+
+
+class TraceSpan:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        stack = self.tracer.local.__dict__.setdefault('stack', [])
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.start = time.time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.started
+        self.tracer.local.stack.pop()
+        if self.tracer.enabled:
+            self.tracer.record(self.name, self.start, duration, self.parent)
+        return False
+
+
+def traced(method):
+    # times every call of a ChatDB method as a span named after the method
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.tracer.span(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# builds large seeded workloads of bound queries for one dataset: the templates are compiled
+# once, parameters are drawn with numpy a batch at a time and query types follow a weighted mix
+class WorkloadGenerator:
+    def __init__(self, chatdb, dataset_name, db_type, seed=WORKLOAD_SEED, mix=None):
+        self.chatdb = chatdb
+        self.dataset_name = dataset_name
+        self.db_type = db_type
+        self.rng = np.random.default_rng(seed)
+        schema = chatdb.get_schema(dataset_name, db_type)
+        self.cols = schema['names']
+        # same fallbacks as the 5-query generators
+        self.numeric_cols = schema['numeric'] or self.cols
+        self.text_cols = schema['text'] or self.cols
+        self.stats = schema['stats']
+        if not self.cols:
+            raise ValueError(f"{dataset_name} has no columns to build queries from")
+
+        if db_type in SQL_ENGINES:
+            self.templates = self.compile_sql()
+            mix = mix or SQL_WORKLOAD_MIX
+        else:
+            self.templates = self.compile_mongo()
+            mix = mix or MONGO_WORKLOAD_MIX
+        unknown = set(mix) - set(self.templates)
+        if unknown:
+            raise ValueError(f"unknown query type(s) in mix: {', '.join(sorted(unknown))}")
+        self.types = [query_type for query_type in mix if mix[query_type] > 0]
+        if not self.types:
+            raise ValueError("the mix gives every query type a weight of 0")
+        weights = np.array([mix[query_type] for query_type in self.types], dtype=float)
+        self.weights = weights / weights.sum()
+        self.precompute_parameters()
+
+    def compile_sql(self):
+        # template text plus the column usage with placeholder names, bound per query
+        identity = {name: name for name in SQL_COLUMN_PARAMS}
+        return {
+            query_type: [
+                dict(pattern, usage=self.chatdb.sql_column_usage(pattern['template'], identity))
+                for pattern in patterns
+            ]
+            for query_type, patterns in self.chatdb.get_query_patterns().items()
+        }
+
+    def compile_mongo(self):
+        # the patterns are built once with tokens in place of the chosen fields and threshold,
+        # and kept as JSON text so binding is a single regex substitution
+        self.sample_size = min(3, len(self.cols))
+        params = {
+            'field': WORKLOAD_TOKEN.format('field'),
+            'numeric': WORKLOAD_TOKEN.format('numeric'),
+            'threshold': WORKLOAD_TOKEN.format('threshold'),
+            'text': WORKLOAD_TOKEN.format('text'),
+            'sample_fields': [WORKLOAD_TOKEN.format(f"sample_field{i}") for i in range(self.sample_size)]
+        }
+        self.token_pattern = re.compile('"' + WORKLOAD_TOKEN.format(r'(\w+)') + '"|' + WORKLOAD_TOKEN.format(r'(\w+)'))
+        return {
+            query_type: [json.dumps(pattern) for pattern in patterns]
+            for query_type, patterns in self.chatdb.build_mongo_query_patterns(params).items()
+        }
+
+    def precompute_parameters(self):
+        # everything that comes from the column statistics is worked out once per column
+        chatdb = self.chatdb
+        self.thresholds = [chatdb.numeric_threshold(self.stats.get(col)) for col in self.numeric_cols]
+        self.min_counts = [chatdb.group_count_threshold(self.stats.get(col)) for col in self.text_cols]
+        self.total_thresholds = [
+            [chatdb.group_total_threshold(self.stats.get(group), self.stats.get(numeric)) for numeric in self.numeric_cols]
+            for group in self.text_cols
+        ]
+        self.patterns = [chatdb.text_pattern_candidates(self.stats.get(col)) for col in self.text_cols]
+
+    def draw(self, size):
+        """Draws the query types and every parameter for `size` queries as numpy arrays."""
+        rng = self.rng
+        draws = {
+            'type': rng.choice(len(self.types), size=size, p=self.weights),
+            'variant': rng.integers(0, 1 << 30, size=size),
+            'group': rng.integers(len(self.text_cols), size=size),
+            'numeric': rng.integers(len(self.numeric_cols), size=size),
+            'text': rng.integers(len(self.text_cols), size=size),
+            'col': rng.integers(len(self.cols), size=size),
+            'ord_col': rng.integers(len(self.cols), size=size),
+            'ord_col1': rng.integers(len(self.cols), size=size),
+            'pick': rng.integers(0, 1 << 30, size=size),
+            'min_count': rng.integers(2, 6, size=size),
+            'threshold': rng.integers(10, 101, size=size),
+            'total_threshold': rng.integers(10, 101, size=size),
+            'limit': rng.integers(5, 11, size=size)
+        }
+        # a second ordering column different from the first whenever there is more than one
+        offset = rng.integers(1, max(2, len(self.cols)), size=size)
+        draws['ord_col2'] = (draws['ord_col1'] + offset) % len(self.cols)
+        if self.db_type not in SQL_ENGINES:
+            # distinct projection fields: the first few columns of a random permutation per query
+            draws['sample'] = rng.random((size, len(self.cols))).argsort(axis=1)[:, :self.sample_size]
+        return draws
+
+    def generate(self, count):
+        """Yields `count` bound queries, drawing parameters WORKLOAD_BATCH_SIZE queries at a time."""
+        for start in range(0, count, WORKLOAD_BATCH_SIZE):
+            size = min(WORKLOAD_BATCH_SIZE, count - start)
+            # always a full batch, so a smaller count gives a prefix of a larger one with the same seed
+            draws = self.draw(WORKLOAD_BATCH_SIZE)
+            bind = self.bind_sql if self.db_type in SQL_ENGINES else self.bind_mongo
+            for i in range(size):
+                yield bind(draws, i)
+
+    def stat_or(self, value, drawn):
+        return value if value is not None else int(drawn)
+
+    def bind_sql(self, draws, i):
+        query_type = self.types[draws['type'][i]]
+        variants = self.templates[query_type]
+        pattern = variants[draws['variant'][i] % len(variants)]
+        group, numeric, text = draws['group'][i], draws['numeric'][i], draws['text'][i]
+        candidates = self.patterns[text]
+        params = {
+            'table': self.dataset_name,
+            'group_col': self.text_cols[group],
+            'numeric_col': self.numeric_cols[numeric],
+            'text_col': self.text_cols[text],
+            'ord_col': self.cols[draws['ord_col'][i]],
+            'ord_col1': self.cols[draws['ord_col1'][i]],
+            'ord_col2': self.cols[draws['ord_col2'][i]],
+            'col': self.cols[draws['col'][i]],
+            # statistics of 0 are real thresholds, only missing ones fall back to the drawn values
+            'min_count': self.stat_or(self.min_counts[group], draws['min_count'][i]),
+            'threshold': self.stat_or(self.thresholds[numeric], draws['threshold'][i]),
+            'total_threshold': self.stat_or(self.total_thresholds[group][numeric], draws['total_threshold'][i]),
+            'limit': int(draws['limit'][i]),
+            'pattern': candidates[draws['pick'][i] % len(candidates)] if candidates
+                       else ['A%', '%B', '%C%'][draws['pick'][i] % 3]
+        }
+        usage = {role: [params[name] for name in names] for role, names in pattern['usage'].items()}
+        return {
+            'type': query_type,
+            'description': pattern['description'].format(**params),
+            'query': pattern['template'].format(**params),
+            'columns': usage
+        }
+
+    def bind_mongo(self, draws, i):
+        query_type = self.types[draws['type'][i]]
+        variants = self.templates[query_type]
+        compiled = variants[draws['variant'][i] % len(variants)]
+        threshold = self.thresholds[draws['numeric'][i]]
+        values = {
+            'field': self.cols[draws['col'][i]],
+            'numeric': self.numeric_cols[draws['numeric'][i]],
+            # 50 when there are no statistics, like get_mongo_query_patterns
+            'threshold': 50 if threshold is None else threshold,
+            'text': self.text_cols[draws['text'][i]]
+        }
+        for j, col in enumerate(draws['sample'][i]):
+            values[f"sample_field{j}"] = self.cols[col]
+
+        def substitute(match):
+            if match.group(1):
+                # a whole JSON string that is a token becomes the raw value, so numbers stay numbers
+                return json.dumps(values[match.group(1)])
+            # a token inside a longer string is spliced in as escaped text
+            return json.dumps(str(values[match.group(2)]))[1:-1]
+        return dict(json.loads(self.token_pattern.sub(substitute, compiled)), type=query_type)
+
+
 # initializing the ChatDB class itself
 # we want the current db type and dataset to always be shown during prompting
 # to ensure we can easily track exactly what database/dataset we are currently using
@@ -33,8 +738,42 @@ class ChatDB:
             'upload dataset': 'Upload Dataset',
             'explore database': 'Show Sample Data',
             'generate queries': 'Generate Sample Queries',
+            'refresh datasets': 'Reload the Dataset Catalog',
+            'pool stats': 'Show Connection Pool Stats',
+            'cache stats': 'Show Query Result Cache Stats',
+            'stats': 'Show Timing Stats per Step',
+            'export traces': 'Export Timing Spans as JSON Lines',
+            'suggest indexes': 'Suggest Indexes for the Queries Run So Far',
+            'build indexes': 'Build Suggested Indexes and Measure Savings',
+            'generate workload': 'Write a Seeded Bulk Query Workload to a JSON Lines File',
             'exit': 'Exit Program'
         }
+        # pooled mysql connections and the shared mongo client
+        self.connections = ConnectionManager()
+        # per-batch error reports from the last mongo upload
+        self.upload_errors = []
+        # session-level dataset catalog per backend, each loaded on first use and
+        # reloaded after CATALOG_TTL seconds or on invalidation
+        # db_type -> {'names': [...], 'loaded_at': monotonic time}
+        self.catalog = {}
+        self.catalog_index = {}
+        # db_type -> (monotonic time, reason) for backends that didn't answer the last probe
+        self.unavailable = {}
+        self.catalog_lock = threading.Lock()
+        # backends the user has listed or uploaded to, the only ones a bare dataset name is looked up in
+        self.used_db_types = set()
+        # result cache for executed queries, keyed by query text and dataset version
+        self.result_cache = ResultCache()
+        # workload-driven index suggestions
+        self.index_advisor = IndexAdvisor()
+        # timing spans for the 'stats' command
+        self.tracer = Tracer()
+        # queries running right now, token -> how to cancel them on the server
+        self.active_queries = {}
+        # (db_type, dataset) -> version counter, bumped on every upload
+        self.dataset_versions = {}
+        # schema registry: (db_type, dataset) -> column names, types, sample rows and numeric/text groupings
+        self.schemas = {}
 
     # getter methods
 
@@ -51,83 +790,204 @@ class ChatDB:
         return f"ChatDB[{self.current_db_type.upper()}->{self.current_dataset}]"
     
     # source: https://dev.mysql.com/doc/connector-python/en/connector-python-example-connecting.html
-    def connect_mysql(self):
-        return mysql.connector.connect(**MYSQL_CONFIG)
+    @traced
+    def connect_mysql(self, **options):
+        # pooled connection, calling close() on it hands it back to the pool
+        # extra options (e.g. allow_local_infile) get a one-off connection instead
+        return self.connections.mysql(**options)
 
         
     # source: https://www.w3schools.com/python/python_mongodb_create_collection.asp
+    @traced
     def connect_mongo(self):
-        client = MongoClient("mongodb://localhost:27017")
-        return client[MONGODB_DATABASE]
+        # every call shares the same MongoClient
+        return self.connections.mongo()
 
+    @traced
+    def connect_duckdb(self):
+        # cursor on the embedded database, close it when done
+        return self.connections.duckdb()
 
-    def get_databases(self):
-        # databases is a dictionary that stores the database information
-        databases = {'sql': [], 'mongo': []}
+    def show_pool_stats(self):
+        print("\nConnection Pool Stats:")
+        for key, value in self.connections.get_stats().items():
+            print(f"{key}: {value}")
 
-        # MYSQL connection section using mysql_connector
-        cnx = self.connect_mysql()
-        # Check if the connection is valid
-        if cnx is not None:
-            cursor = cnx.cursor()
-            # Ensure cursor object is valid
-            if cursor is not None:
-                # SQL show tables equivalent 
+    def close(self):
+        # release pooled connections when the session ends
+        self.connections.close()
+
+
+    def available_db_types(self):
+        # duckdb is only offered when it is installed
+        return [db_type for db_type in ('sql', 'mongo', 'duckdb') if db_type != 'duckdb' or DUCKDB_AVAILABLE]
+
+    @traced
+    def get_databases(self, refresh=False, db_types=None):
+        """
+        Returns {db_type: [dataset names]} for the given backends (default: all of them).
+        Backends with a missing or stale listing are asked concurrently, so the wait is the
+        slowest probe, capped at CATALOG_PROBE_TIMEOUT. A backend that doesn't answer in time
+        is marked unavailable and listed as empty.
+        """
+        db_types = db_types or self.available_db_types()
+        self.used_db_types.update(db_types)
+        if refresh:
+            # an explicit refresh also drops the cached schemas of those backends
+            for key in [key for key in self.schemas if key[0] in db_types]:
+                del self.schemas[key]
+
+        now = time.monotonic()
+        stale = []
+        for db_type in db_types:
+            entry = self.catalog.get(db_type)
+            # serve the cached listing while it is still fresh
+            if not refresh and entry is not None and now - entry['loaded_at'] < CATALOG_TTL:
+                continue
+            # don't wait on a backend that just failed again until the retry interval is up
+            failed = self.unavailable.get(db_type)
+            if not refresh and failed is not None and now - failed[0] < CATALOG_RETRY_INTERVAL:
+                continue
+            stale.append(db_type)
+        if stale:
+            self.probe_catalogs(stale)
+
+        databases = {}
+        for db_type in db_types:
+            entry = self.catalog.get(db_type)
+            databases[db_type] = entry['names'] if entry is not None and db_type not in self.unavailable else []
+
+        self.rebuild_catalog_index()
+        return databases
+
+    def probe_catalogs(self, db_types, timeout=CATALOG_PROBE_TIMEOUT):
+        # one daemon thread per backend: a probe stuck past the deadline is left behind
+        # instead of blocking the prompt (or interpreter exit) until the driver gives up
+        def probe(db_type):
+            try:
+                names = self.load_catalog(db_type)
+            except Exception as e:
+                with self.catalog_lock:
+                    self.unavailable[db_type] = (time.monotonic(), str(e))
+                return
+            # a probe that finishes after the deadline still fills the catalog for the next lookup
+            with self.catalog_lock:
+                self.catalog[db_type] = {'names': names, 'loaded_at': time.monotonic()}
+                self.unavailable.pop(db_type, None)
+
+        threads = []
+        for db_type in db_types:
+            thread = threading.Thread(target=probe, args=(db_type,), name=f"catalog-{db_type}", daemon=True)
+            thread.start()
+            threads.append((db_type, thread))
+
+        deadline = time.monotonic() + timeout
+        for db_type, thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+            if thread.is_alive():
+                with self.catalog_lock:
+                    self.unavailable[db_type] = (time.monotonic(), f"no answer within {timeout}s")
+
+    def rebuild_catalog_index(self):
+        # index dataset name -> db type so lookups are a single dict access
+        # sql is indexed last so it wins a name clash, like the original lookup order
+        index = {}
+        for db_type in ('mongo', 'duckdb', 'sql'):
+            if db_type in self.unavailable:
+                continue
+            for name in self.catalog.get(db_type, {}).get('names', []):
+                index[name] = db_type
+        self.catalog_index = index
+
+    def invalidate_catalog(self, db_type=None):
+        # the next lookup reloads the listing of that backend (or of all of them) from the server
+        with self.catalog_lock:
+            if db_type is None:
+                self.catalog.clear()
+                self.unavailable.clear()
+            else:
+                self.catalog.pop(db_type, None)
+                self.unavailable.pop(db_type, None)
+        self.rebuild_catalog_index()
+
+    def load_catalog(self, db_type):
+        # lists one backend's datasets (the column statistics table is chatdb metadata, not a dataset)
+        if db_type == 'sql':
+            # MYSQL connection section using mysql_connector
+            cnx = self.connect_mysql()
+            try:
+                cursor = cnx.cursor()
+                # SQL show tables equivalent
                 cursor.execute("SHOW TABLES")
-                tables = cursor.fetchall()
-                if tables:
-                # extract table names using a loop and append to the 'sql' list
-                    for table in tables:
-                        databases['sql'].append(table[0])
-            cnx.close()
-    
+                return [table[0] for table in cursor.fetchall() if self.is_dataset_name(table[0])]
+            finally:
+                cnx.close()
+
+        if db_type == 'duckdb':
+            con = self.connect_duckdb()
+            try:
+                tables = con.execute("SHOW TABLES").fetchall()
+                return [table[0] for table in tables if self.is_dataset_name(table[0])]
+            finally:
+                con.close()
+
         # Get MongoDB collections
         db = self.connect_mongo()
-        if db is not None:  # Check if the MongoDB connection is valid
-            collections = db.list_collection_names()
-            if collections:  # Check if any collections are returned
-                databases['mongo'] = collections
-                
-        return databases
+        return [name for name in db.list_collection_names() if self.is_dataset_name(name)]
 
-    def display_available_databases(self):
-        databases = self.get_databases()
+    def is_dataset_name(self, name):
+        # staging and retired copies of a dataset only exist while an upload swaps them
+        return name != COLUMN_STATS_TABLE and not name.endswith((STAGING_SUFFIX, RETIRED_SUFFIX))
+
+    def display_available_databases(self, refresh=False, db_types=None):
+        databases = self.get_databases(refresh, db_types)
         
         print("\nAvailable Databases")
-        print(f"\nMySQL Database: {MYSQL_CONFIG['database']}")
-        print("Available datasets:")
-        if databases['sql']:
-            for table in databases['sql']:
-                print(f"  - {table}")
-        else:
-            print("No datasets available")
-
-        print(f"\nMongoDB Database: {MONGODB_DATABASE}")
-        print("Available collections:")
-        if databases['mongo']:
-            for collection in databases['mongo']:
-                print(f"  - {collection}")
-        else:
-            print("No collections available")
+        sections = {
+            'sql': (MYSQL_CONFIG['database'], "datasets"),
+            'mongo': (MONGODB_DATABASE, "collections"),
+            'duckdb': (DUCKDB_PATH, "tables")
+        }
+        for db_type, names in databases.items():
+            database, kind = sections[db_type]
+            print(f"\n{BACKEND_NAMES[db_type]} Database: {database}")
+            if db_type in self.unavailable:
+                # partial results: the other backends are still listed
+                print(f"{BACKEND_NAMES[db_type]} unavailable ({self.unavailable[db_type][1]})")
+                continue
+            print(f"Available {kind}:")
+            if names:
+                for name in names:
+                    print(f"  - {name}")
+            else:
+                print(f"No {kind} available")
 
         print("\nPlease enter a name of a table/collection, or alternatively upload a new dataset using the command 'upload dataset'.")
 
-    def find_dataset_type(self, dataset_name):
+    def find_dataset_type(self, dataset_name, db_type=None):
         """Find if dataset exists and its type"""
-        databases = self.get_databases()
-        
-        if dataset_name in databases['sql']:
-            return True, 'sql'
-        elif dataset_name in databases['mongo']:
-            return True, 'mongo'
+        # only the asked-for backend is contacted when the type is known
+        if db_type:
+            databases = self.get_databases(db_types=[db_type])
+            if dataset_name in databases[db_type]:
+                return True, db_type
+            return False, None
+
+        # a bare name is only looked up in the backends the user has asked for already,
+        # probing the others would connect to databases they may not use at all
+        if self.used_db_types:
+            self.get_databases(db_types=[db_type for db_type in self.available_db_types() if db_type in self.used_db_types])
+        db_type = self.catalog_index.get(dataset_name)
+        if db_type:
+            return True, db_type
         
         return False, None
     
     # setter functions
 
-    def set_current_dataset(self, dataset_name):
+    def set_current_dataset(self, dataset_name, db_type=None):
         """Set the current dataset and its type"""
-        exists, db_type = self.find_dataset_type(dataset_name)
+        exists, db_type = self.find_dataset_type(dataset_name, db_type)
         if exists:
             self.current_db_type = db_type
             self.current_dataset = dataset_name
@@ -180,18 +1040,74 @@ class ChatDB:
         return None, None
 
 
-    def upload_csv(self, file_path, dataset_name, database_type):
+    def upload_csv(self, file_path, dataset_name, database_type, stream=False,
+                   memory_budget_mb=STREAM_MEMORY_BUDGET_MB, auto_index=AUTO_INDEX_ON_UPLOAD,
+                   mode='replace', key=None):
+        if not self.is_dataset_name(dataset_name):
+            # these names are hidden from the catalog, a dataset called that would vanish
+            print(f"\n'{dataset_name}' is reserved, dataset names can't be {COLUMN_STATS_TABLE} "
+                  f"or end in {STAGING_SUFFIX} or {RETIRED_SUFFIX}")
+            return
+        self.upload_errors = []
+        self.used_db_types.add(database_type)
+        # replace uploads are written to a staging copy, readers keep the old data until the swap
+        staging = dataset_name + STAGING_SUFFIX
+        # set once the new data is in place, a later error doesn't undo the upload
+        loaded = False
         try:
-            # Read the CSV file at the given file path into a Pandas DataFrame
-            df = pd.read_csv(file_path)
+            if mode != 'replace':
+                # only new and changed rows are written, the rest of the dataset stays in place
+                if stream:
+                    print("\nAppend/upsert compares the whole file with the dataset, reading it in one go")
+                df = self.clean_dataframe(pd.read_csv(file_path))
+                self.upload_incremental(df, dataset_name, database_type, mode, key)
+                loaded = True
+                row_count = None
+            elif stream:
+                # Read and write the file chunk by chunk so memory stays within the budget
+                # (df is the sample the schema was inferred from)
+                df, row_count = self.stream_csv(file_path, staging, database_type, memory_budget_mb)
+            else:
+                # Read the CSV file at the given file path into a Pandas DataFrame
+                df = pd.read_csv(file_path)
+                # turn numbers stored as text (thousands separators, currency) into numeric columns
+                df = self.clean_dataframe(df)
 
-            # Check the target database type and call the respective upload function
-            if database_type == 'sql':
-                # Upload the DataFrame to an SQL database
-                self.upload_to_sql(df, dataset_name)
-            elif database_type == 'mongo':
-                # Upload the DataFrame to a MongoDB collection
-                self.upload_to_mongo(df, dataset_name)
+                # every row carries a content hash for later append/upsert uploads
+                hashed = self.add_row_hashes(df)
+
+                # Check the target database type and call the respective upload function
+                if database_type == 'sql':
+                    # Upload the DataFrame to an SQL database
+                    self.upload_to_sql(hashed, staging)
+                elif database_type == 'mongo':
+                    # Upload the DataFrame to a MongoDB collection
+                    self.upload_to_mongo(hashed, staging)
+                elif database_type == 'duckdb':
+                    # Upload the DataFrame to a table in the embedded DuckDB file
+                    self.upload_to_duckdb(hashed, staging)
+                row_count = len(df)
+
+            if mode == 'replace':
+                if auto_index:
+                    # indexes are cheaper to build once after the bulk load than during it,
+                    # and on the staging copy the build doesn't block anyone's queries
+                    try:
+                        self.build_indexes(staging, database_type, self.likely_indexes(df), measure=False)
+                    except Exception as e:
+                        # the data is complete without them, so the upload goes on
+                        print(f"Could not build indexes: {e}")
+                    self.invalidate_schema(staging, database_type)
+                self.swap_staging(dataset_name, database_type)
+                loaded = True
+            elif auto_index:
+                self.invalidate_schema(dataset_name, database_type)
+                self.build_indexes(dataset_name, database_type, self.likely_indexes(df), measure=False)
+
+            # column statistics drive the selectivity of the generated query parameters
+            # (an append/upsert file may be only part of the data, so it keeps the last full upload's)
+            if row_count is not None:
+                self.save_column_stats(dataset_name, database_type, self.compute_column_stats(df, row_count))
 
             # Print a confirmation message with details about the upload
             print(f"\nSuccessfully uploaded {file_path} to {database_type} database as {dataset_name}")
@@ -199,64 +1115,918 @@ class ChatDB:
             # Update the reference to the current dataset being worked on
             self.current_dataset = dataset_name
 
+            # the old schema is stale now, explore will load the new one
+            self.invalidate_schema(dataset_name, database_type)
+
             # Display a sample of the uploaded data for verification
             self.show_sample_data(dataset_name, database_type)
         except Exception as e:
-            # Catch and log any errors that occur during the upload process
-            print(f"Error uploading data: {e}")
+            if loaded:
+                # the dataset was replaced/updated, only a step after that (stats, sample) failed
+                print(f"\n{dataset_name} was uploaded, but finishing the upload failed: {e}")
+            else:
+                # Catch and log any errors that occur during the upload process
+                print(f"Error uploading data: {e}")
+                # a failed replace upload leaves the old dataset in place, only the staging copy goes
+                if mode == 'replace':
+                    self.drop_staging(staging, database_type)
+        finally:
+            # the upload may have created, replaced or updated a dataset
+            self.invalidate_catalog(database_type)
+            self.invalidate_schema(dataset_name, database_type)
+            # cached results for the old data no longer match
+            self.bump_dataset_version(dataset_name, database_type)
+
+    def swap_staging(self, dataset_name, db_type):
+        """
+        Replaces the dataset with its fully loaded (and indexed) staging copy in one atomic step,
+        so a reader sees either all of the old data or all of the new.
+        """
+        staging = dataset_name + STAGING_SUFFIX
+        retired = dataset_name + RETIRED_SUFFIX
+        if db_type == 'sql':
+            # source: https://dev.mysql.com/doc/refman/8.0/en/rename-table.html
+            cnx = self.connect_mysql()
+            try:
+                cursor = cnx.cursor()
+                cursor.execute(f"DROP TABLE IF EXISTS {retired}")
+                if dataset_name in self.load_catalog('sql'):
+                    # both renames happen as one atomic operation
+                    cursor.execute(f"RENAME TABLE {dataset_name} TO {retired}, {staging} TO {dataset_name}")
+                    # dropping the old data happens after the swap, outside of the readers' way
+                    cursor.execute(f"DROP TABLE {retired}")
+                else:
+                    cursor.execute(f"RENAME TABLE {staging} TO {dataset_name}")
+            finally:
+                cnx.close()
+        elif db_type == 'duckdb':
+            # duckdb has no multi-table rename, but a transaction makes drop + rename one step
+            con = self.connect_duckdb()
+            try:
+                con.execute("BEGIN TRANSACTION")
+                con.execute(f"DROP TABLE IF EXISTS {dataset_name}")
+                con.execute(f"ALTER TABLE {staging} RENAME TO {dataset_name}")
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+            finally:
+                con.close()
+        else:
+            # source: https://www.mongodb.com/docs/manual/reference/command/renameCollection/
+            # dropTarget replaces the live collection (indexes included) in one step
+            self.connect_mongo()[staging].rename(dataset_name, dropTarget=True)
+
+    def drop_staging(self, staging, db_type):
+        try:
+            if db_type == 'sql':
+                cnx = self.connect_mysql()
+                try:
+                    cnx.cursor().execute(f"DROP TABLE IF EXISTS {staging}")
+                finally:
+                    cnx.close()
+            elif db_type == 'duckdb':
+                con = self.connect_duckdb()
+                try:
+                    con.execute(f"DROP TABLE IF EXISTS {staging}")
+                finally:
+                    con.close()
+            else:
+                self.connect_mongo()[staging].drop()
+        except Exception as e:
+            print(f"Could not drop {staging}: {e}")
+        self.invalidate_schema(staging, db_type)
+
+    def stream_csv(self, file_path, dataset_name, database_type, memory_budget_mb=STREAM_MEMORY_BUDGET_MB):
+        start = time.perf_counter()
+
+        # infer the schema once from a sample, every later chunk is coerced to it
+        sample = self.clean_dataframe(pd.read_csv(file_path, nrows=STREAM_SAMPLE_ROWS))
+        schema = sample.dtypes
+        chunk_size = self.chunk_size_for_budget(sample, memory_budget_mb)
+        print(f"\nStreaming {file_path} in chunks of {chunk_size} rows (budget {memory_budget_mb} MB)")
+
+        # text columns are read as strings so a chunk of digits can't change their type
+        text_dtypes = {}
+        for col, dtype in schema.items():
+            if not pd.api.types.is_numeric_dtype(dtype):
+                text_dtypes[col] = object
+
+        if database_type == 'sql':
+            handle = cnx = self.connect_mysql()
+        elif database_type == 'duckdb':
+            handle = con = self.connect_duckdb()
+        else:
+            handle = None
+            collection = self.connect_mongo()[dataset_name]
+
+        total = 0
+        try:
+            if database_type == 'sql':
+                cursor = cnx.cursor()
+                cursor.execute(f"DROP TABLE IF EXISTS {dataset_name}")
+                # types come from a sample, so leave headroom for values the sample didn't see
+                cursor.execute(self.generate_create_table_stmt(self.add_row_hashes(sample), dataset_name, exact=False))
+            elif database_type == 'duckdb':
+                con.execute(f"DROP TABLE IF EXISTS {dataset_name}")
+            else:
+                collection.drop()
+
+            for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype=text_dtypes):
+                chunk = self.add_row_hashes(self.apply_stream_schema(chunk, schema))
+                if database_type == 'sql':
+                    self.insert_sql_batches(cnx, cursor, chunk, dataset_name)
+                elif database_type == 'duckdb':
+                    # the first chunk creates the table, later chunks are cast to its column types
+                    con.register('chunk_df', chunk)
+                    if total == 0:
+                        con.execute(f"CREATE TABLE {dataset_name} AS SELECT * FROM chunk_df")
+                    else:
+                        con.execute(f"INSERT INTO {dataset_name} SELECT * FROM chunk_df")
+                    con.unregister('chunk_df')
+                else:
+                    self.bulk_write_mongo(collection, chunk, offset=total)
+                total += len(chunk)
+                print(f"  {total} rows written")
+
+            if database_type == 'sql':
+                cnx.commit()
+            elif database_type == 'mongo':
+                self.report_upload_errors()
+        finally:
+            # a chunk that fails to load still gives the connection back
+            if handle is not None:
+                handle.close()
+
+        self.report_load_rate(total, dataset_name, start)
+        # the sample stands in for the whole file for statistics and upload-time indexes
+        return sample, total
+
+    def compute_column_stats(self, df, row_count=None):
+        """
+        Computes per-column statistics in one vectorized pass: row/null/distinct counts,
+        min/max and quantiles for numeric columns, and the most frequent values.
+        row_count overrides the row count when df is only a sample of the data.
+        """
+        rows = len(df) if row_count is None else row_count
+        nulls = df.isna().sum()
+        distinct = df.nunique()
+
+        numeric = df.select_dtypes('number')
+        if not numeric.empty:
+            minimums = numeric.min()
+            maximums = numeric.max()
+            quantiles = numeric.quantile(list(STATS_QUANTILES))
+
+        stats = {}
+        for col in df.columns:
+            top = df[col].value_counts().head(STATS_TOP_VALUES)
+            column_stats = {
+                'rows': int(rows),
+                'nulls': int(nulls[col]),
+                'distinct': int(distinct[col]),
+                # [value, count] pairs, values converted to plain python for json
+                'top': [[self.to_python(val), int(count)] for val, count in top.items()]
+            }
+            if col in numeric.columns and numeric[col].notna().any():
+                column_stats['min'] = self.to_python(minimums[col])
+                column_stats['max'] = self.to_python(maximums[col])
+                column_stats['quantiles'] = {str(q): self.to_python(quantiles.at[q, col]) for q in STATS_QUANTILES}
+            stats[col] = column_stats
+        return stats
+
+    def to_python(self, value):
+        # numpy scalars -> plain python values that json and bson can encode
+        return value.item() if hasattr(value, 'item') else value
+
+    def save_column_stats(self, dataset_name, db_type, stats):
+        if db_type == 'sql':
+            cnx = self.connect_mysql()
+            try:
+                cursor = cnx.cursor()
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {COLUMN_STATS_TABLE} ("
+                    "dataset_name VARCHAR(64), column_name VARCHAR(255), stats JSON, "
+                    "PRIMARY KEY (dataset_name, column_name))"
+                )
+                cursor.execute(f"DELETE FROM {COLUMN_STATS_TABLE} WHERE dataset_name = %s", (dataset_name,))
+                cursor.executemany(
+                    f"INSERT INTO {COLUMN_STATS_TABLE} VALUES (%s, %s, %s)",
+                    [(dataset_name, col, json.dumps(col_stats, default=str)) for col, col_stats in stats.items()]
+                )
+                cnx.commit()
+            finally:
+                cnx.close()
+        elif db_type == 'duckdb':
+            con = self.connect_duckdb()
+            try:
+                con.execute(
+                    f"CREATE TABLE IF NOT EXISTS {COLUMN_STATS_TABLE} ("
+                    "dataset_name VARCHAR, column_name VARCHAR, stats VARCHAR, "
+                    "PRIMARY KEY (dataset_name, column_name))"
+                )
+                con.execute(f"DELETE FROM {COLUMN_STATS_TABLE} WHERE dataset_name = ?", [dataset_name])
+                if stats:
+                    con.executemany(
+                        f"INSERT INTO {COLUMN_STATS_TABLE} VALUES (?, ?, ?)",
+                        [[dataset_name, col, json.dumps(col_stats, default=str)] for col, col_stats in stats.items()]
+                    )
+            finally:
+                con.close()
+        else:
+            collection = self.connect_mongo()[COLUMN_STATS_TABLE]
+            collection.delete_many({'dataset': dataset_name})
+            if stats:
+                collection.insert_many([
+                    {'dataset': dataset_name, 'column': col, 'stats': json.loads(json.dumps(col_stats, default=str))}
+                    for col, col_stats in stats.items()
+                ])
+
+    def load_column_stats(self, dataset_name, db_type):
+        # datasets uploaded before statistics existed simply have none
+        if db_type == 'sql':
+            cnx = self.connect_mysql()
+            try:
+                cursor = cnx.cursor()
+                try:
+                    cursor.execute(
+                        f"SELECT column_name, stats FROM {COLUMN_STATS_TABLE} WHERE dataset_name = %s", (dataset_name,)
+                    )
+                except mysql.connector.errors.ProgrammingError:
+                    return {}
+                return {col: json.loads(col_stats) for col, col_stats in cursor.fetchall()}
+            finally:
+                cnx.close()
+        if db_type == 'duckdb':
+            con = self.connect_duckdb()
+            try:
+                try:
+                    rows = con.execute(
+                        f"SELECT column_name, stats FROM {COLUMN_STATS_TABLE} WHERE dataset_name = ?", [dataset_name]
+                    ).fetchall()
+                except duckdb.CatalogException:
+                    return {}
+                return {col: json.loads(col_stats) for col, col_stats in rows}
+            finally:
+                con.close()
+        collection = self.connect_mongo()[COLUMN_STATS_TABLE]
+        return {doc['column']: doc['stats'] for doc in collection.find({'dataset': dataset_name})}
+
+    def chunk_size_for_budget(self, sample, memory_budget_mb):
+        """
+        Estimates how many csv rows fit in the memory budget, based on the
+        in-memory size of the sample rows.
+        """
+        if sample.empty:
+            return STREAM_SAMPLE_ROWS
+        bytes_per_row = sample.memory_usage(deep=True, index=False).sum() / len(sample)
+        budget_bytes = memory_budget_mb * 1024 * 1024
+        return max(1, int(budget_bytes / (bytes_per_row * STREAM_MEMORY_OVERHEAD)))
+
+    def apply_stream_schema(self, chunk, schema):
+        # coerce numeric columns so stray values become NaN (NULL) instead of changing the column type
+        for col, dtype in schema.items():
+            if col in chunk and pd.api.types.is_numeric_dtype(dtype) and dtype != bool:
+                if pd.api.types.is_numeric_dtype(chunk[col]):
+                    chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+                else:
+                    # the sample parsed this column out of text (e.g. "101,200"), do the same here
+                    chunk[col] = self.to_number(chunk[col])
+        return chunk
 
     # implementation inspired from:
     # https://medium.com/@affanhamid007/how-to-convert-csv-to-sql-database-using-python-and-sqlite3-b693d687c04a
 
-    def upload_to_sql(self, df, table_name):
-        cnx = self.connect_mysql()
-        cursor = cnx.cursor()
+    def upload_to_sql(self, df, table_name, batch_size=SQL_BATCH_SIZE,
+                      commit_interval=SQL_COMMIT_INTERVAL, use_load_data=SQL_USE_LOAD_DATA):
+        start = time.perf_counter()
+        # only LOAD DATA needs a connection of its own, batched inserts use a pooled one
+        cnx = self.connect_mysql(**({'allow_local_infile': True} if use_load_data else {}))
+        try:
+            cursor = cnx.cursor()
+
+            # Generate a SQL CREATE TABLE statement based on the DataFrame's structure
+            create_table_stmt = self.generate_create_table_stmt(df, table_name)
+
+            # Drop the table if it already exists to avoid conflicts with new data
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+
+            # Execute the CREATE TABLE statement to create the new table
+            cursor.execute(create_table_stmt)
 
-        # Generate a SQL CREATE TABLE statement based on the DataFrame's structure
-        create_table_stmt = self.generate_create_table_stmt(df, table_name)
+            loaded = False
+            if use_load_data:
+                try:
+                    # fast path: let the server parse a csv file in one statement
+                    self.load_data_infile(cursor, df, table_name)
+                    loaded = True
+                except mysql.connector.Error as e:
+                    print(f"LOAD DATA LOCAL INFILE failed ({e}), falling back to batched inserts")
 
-        # Drop the table if it already exists to avoid conflicts with new data
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            if not loaded:
+                self.insert_sql_batches(cnx, cursor, df, table_name, batch_size, commit_interval)
 
-        # Execute the CREATE TABLE statement to create the new table
-        cursor.execute(create_table_stmt)
+            cnx.commit()
+        finally:
+            # hands a pooled connection back even when the upload fails halfway
+            cnx.close()
+
+        self.report_load_rate(len(df), table_name, start)
 
-        # Iterate over each row in the DataFrame to insert data into the table
-        for _, row in df.iterrows():
+    def insert_sql_batches(self, cnx, cursor, df, table_name, batch_size=SQL_BATCH_SIZE,
+                           commit_interval=SQL_COMMIT_INTERVAL, insert_stmt=None):
+        if insert_stmt is None:
             # Create placeholders for parameterized queries based on the number of columns
-            placeholders = ','.join(['%s'] * len(row))
+            placeholders = ','.join(['%s'] * len(df.columns))
+            insert_stmt = f"INSERT INTO {table_name} VALUES ({placeholders})"
 
-            # Execute an INSERT statement with values from the current row
-            cursor.execute(f"INSERT INTO {table_name} VALUES ({placeholders})", tuple(row))
+        uncommitted = 0
+        for start in range(0, len(df), batch_size):
+            rows = self.dataframe_to_rows(df.iloc[start:start + batch_size])
+            # executemany sends the whole batch as a single multi-VALUES INSERT
+            cursor.executemany(insert_stmt, rows)
+            uncommitted += len(rows)
+            if uncommitted >= commit_interval:
+                cnx.commit()
+                uncommitted = 0
 
-        cnx.commit()
-        cnx.close()
+    def dataframe_to_rows(self, df):
+        """
+        Converts a DataFrame into a list of plain python tuples for the mysql connector.
+        Missing values (NaN/None/NaT) become None so they are written as NULL.
+        """
+        cleaned = df.astype(object).where(df.notna(), None)
+        return list(cleaned.itertuples(index=False, name=None))
+
+    # source: https://dev.mysql.com/doc/refman/8.0/en/load-data.html
+    def load_data_infile(self, cursor, df, table_name):
+        export = df.copy()
+        for col in export.columns:
+            if export[col].dtype == bool:
+                # BOOLEAN columns expect 0/1 rather than True/False text
+                export[col] = export[col].astype(int)
+            elif pd.api.types.is_float_dtype(export[col]) and (export[col].dropna() % 1 == 0).all():
+                # whole numbers with NULLs are floats in pandas, write them as ints for INT/YEAR columns
+                export[col] = export[col].astype('Int64')
+            elif not pd.api.types.is_numeric_dtype(export[col]):
+                # backslash is the escape character for LOAD DATA, so escape it in the data
+                export[col] = export[col].map(lambda val: val.replace('\\', '\\\\') if isinstance(val, str) else val)
+
+        # \N is how LOAD DATA spells NULL, so missing values stay NULL
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='', encoding='utf-8') as tmp:
+            export.to_csv(tmp, index=False, header=False, na_rep='\\N', lineterminator='\n')
+
+        try:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {table_name} "
+                "CHARACTER SET utf8mb4 "
+                "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                "LINES TERMINATED BY '\\n'",
+                (tmp.name,)
+            )
+        finally:
+            os.remove(tmp.name)
+
+    def report_load_rate(self, row_count, dataset_name, start):
+        # print how fast the upload went so slow loads are easy to spot
+        elapsed = time.perf_counter() - start
+        rate = row_count / elapsed if elapsed > 0 else float(row_count)
+        print(f"Loaded {row_count} rows into {dataset_name} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+
+    # source: https://duckdb.org/docs/guides/python/import_pandas
+    def upload_to_duckdb(self, df, table_name):
+        start = time.perf_counter()
+        con = self.connect_duckdb()
+        try:
+            # duckdb scans the DataFrame in place and stores it column by column
+            con.register('upload_df', df)
+            con.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM upload_df")
+            con.unregister('upload_df')
+        finally:
+            con.close()
+        self.report_load_rate(len(df), table_name, start)
 
-    def upload_to_mongo(self, df, collection_name):
+    def upload_to_mongo(self, df, collection_name, batch_size=MONGO_BATCH_SIZE, workers=MONGO_WORKERS):
+        start = time.perf_counter()
         db = self.connect_mongo()
         # Drop the collection if it exists to avoid duplicate data
         db[collection_name].drop()
-        # Convert the DataFrame to a list of dictionaries and insert them into the collection
-        db[collection_name].insert_many(df.to_dict("records"))
-
-    def generate_create_table_stmt(self, df, table_name):
-        dtype_map = {
-            'int64': 'INT',
-            'float64': 'FLOAT',
-            'object': 'VARCHAR(255)',
-            'datetime64[ns]': 'DATETIME',
-            'bool': 'BOOLEAN'
+        # Insert the documents in parallel unordered batches
+        self.bulk_write_mongo(db[collection_name], df, batch_size, workers)
+        self.report_upload_errors()
+        self.report_load_rate(len(df), collection_name, start)
+
+    # source: https://pymongo.readthedocs.io/en/stable/examples/bulk.html
+    def bulk_write_mongo(self, collection, df, batch_size=MONGO_BATCH_SIZE, workers=MONGO_WORKERS, offset=0,
+                         make_request=None):
+        """
+        Splits the DataFrame into fixed-size batches and sends each one as an unordered
+        bulk_write on a thread pool. A failing batch is recorded in self.upload_errors
+        instead of stopping the upload. Returns the number of documents written.
+        make_request turns a document into a write (default InsertOne).
+        """
+        if df.empty:
+            return 0
+
+        inserted = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # each worker converts its own slice to documents, so only a few batches are in memory at once
+            futures = {}
+            for start in range(0, len(df), batch_size):
+                batch = df.iloc[start:start + batch_size]
+                futures[pool.submit(self.write_mongo_batch, collection, batch, make_request)] = (offset + start, offset + start + len(batch))
+
+            for done, future in enumerate(as_completed(futures), 1):
+                batch_inserted, errors = future.result()
+                inserted += batch_inserted
+                if errors:
+                    first_row, last_row = futures[future]
+                    self.upload_errors.append({
+                        'rows': (first_row, last_row),
+                        'inserted': batch_inserted,
+                        'errors': errors
+                    })
+                # Show progress on a single line
+                print(f"  batch {done}/{len(futures)} written ({inserted} documents)", end='\r')
+        print()
+        return inserted
+
+    def write_mongo_batch(self, collection, batch, make_request=None):
+        make_request = make_request or pymongo.InsertOne
+        requests = [make_request(doc) for doc in batch.to_dict("records")]
+        try:
+            # unordered so one bad document doesn't stop the rest of the batch
+            result = collection.bulk_write(requests, ordered=False)
+            return result.inserted_count + result.upserted_count + result.modified_count, []
+        except pymongo.errors.BulkWriteError as e:
+            written = e.details.get('nInserted', 0) + e.details.get('nUpserted', 0) + e.details.get('nModified', 0)
+            return written, e.details.get('writeErrors', [])
+        except pymongo.errors.PyMongoError as e:
+            return 0, [{'errmsg': str(e)}]
+
+    def report_upload_errors(self):
+        if not self.upload_errors:
+            return
+        print(f"\n{len(self.upload_errors)} batch(es) had write errors:")
+        for report in self.upload_errors:
+            first_row, last_row = report['rows']
+            message = report['errors'][0].get('errmsg', 'unknown error')
+            print(f"  rows {first_row}-{last_row - 1}: {len(report['errors'])} error(s), "
+                  f"{report['inserted']} inserted, first error: {message}")
+
+    def normalize_values(self, df):
+        # the same row must hash (and key) the same whether it came from a file, a chunk or the database:
+        # every value becomes its text, missing ones 'None', whole-number floats without the '.0'
+        # (value by value, so one fraction elsewhere in the column doesn't change the other rows)
+        normalized = df.astype(object).where(df.notna(), None).astype(str)
+        for col in df.columns:
+            values = df[col]
+            if pd.api.types.is_float_dtype(values):
+                whole = values.notna() & (values % 1 == 0)
+                normalized.loc[whole, col] = values[whole].astype('int64').astype(str)
+        return normalized
+
+    # source: https://pandas.pydata.org/docs/reference/api/pandas.util.hash_pandas_object.html
+    def add_row_hashes(self, df):
+        """Returns a copy of df with ROW_HASH_COLUMN: a 64-bit hash of each row's values as 16 hex digits."""
+        data = df.drop(columns=[ROW_HASH_COLUMN], errors='ignore')
+        hashes = pd.util.hash_pandas_object(self.normalize_values(data), index=False)
+        return data.assign(**{ROW_HASH_COLUMN: [f"{value:016x}" for value in hashes]})
+
+    def row_keys(self, df, key_cols):
+        # one comparable string per row for the key columns
+        normalized = self.normalize_values(df[key_cols])
+        keys = normalized[key_cols[0]]
+        for col in key_cols[1:]:
+            keys = keys.str.cat(normalized[col], sep='\x1f')
+        return keys
+
+    def upload_incremental(self, df, dataset_name, db_type, mode, key=None):
+        """
+        Append/upsert: compares the file with the dataset by the key columns (or, without a key,
+        by row hash) and writes only new rows, plus changed ones when upserting.
+        Returns {'inserted', 'updated', 'unchanged', 'skipped'} and prints it.
+        """
+        start = time.perf_counter()
+        key_cols = list(key) if key else []
+        missing = [col for col in key_cols if col not in df.columns]
+        if missing:
+            raise ValueError(f"key column(s) not in the file: {', '.join(missing)}")
+        df = self.add_row_hashes(df)
+        # without a key the content hash is the identity, so a changed row counts as a new one
+        match_cols = key_cols or [ROW_HASH_COLUMN]
+
+        duplicates = df.duplicated(match_cols, keep='last')
+        if duplicates.any():
+            print(f"\n{int(duplicates.sum())} row(s) repeat a key in the file, keeping the last of each")
+            df = df[~duplicates]
+
+        if dataset_name not in self.load_catalog(db_type):
+            # nothing to compare with yet, so this is a full load
+            new, changed, unchanged = df, df.iloc[0:0], df.iloc[0:0]
+            existing_dataset = False
+        else:
+            existing = self.fetch_row_hashes(dataset_name, db_type, match_cols, key_cols)
+            # align the key types with the file's so e.g. DECIMAL 5.00 and float 5.0 compare equal
+            for col in key_cols:
+                if pd.api.types.is_numeric_dtype(df[col]):
+                    existing[col] = pd.to_numeric(existing[col], errors='coerce')
+            existing_keys = self.row_keys(existing, match_cols)
+            repeated = int(existing_keys.duplicated().sum())
+            if repeated and key_cols:
+                print(f"\n{repeated} row(s) in {dataset_name} repeat a key, an upsert updates every row with that key")
+            known = dict(zip(existing_keys, existing[ROW_HASH_COLUMN]))
+            incoming = self.row_keys(df, match_cols)
+            stored = incoming.map(known)
+            is_new = ~incoming.isin(known.keys())
+            is_unchanged = ~is_new & (stored == df[ROW_HASH_COLUMN])
+            new, changed, unchanged = df[is_new], df[~is_new & ~is_unchanged], df[is_unchanged]
+            existing_dataset = True
+
+        # append leaves changed rows alone
+        updates = changed if mode == 'upsert' else changed.iloc[0:0]
+        writes = pd.concat([new, updates])
+        if db_type == 'sql':
+            self.write_incremental_sql(new, updates, dataset_name, match_cols, existing_dataset)
+        elif db_type == 'duckdb':
+            self.write_incremental_duckdb(new, updates, dataset_name, match_cols, existing_dataset)
+        else:
+            self.write_incremental_mongo(writes, dataset_name, match_cols, mode)
+            self.report_upload_errors()
+
+        counts = {
+            'inserted': len(new),
+            'updated': len(changed) if mode == 'upsert' else 0,
+            'unchanged': len(unchanged),
+            'skipped': len(changed) if mode == 'append' else 0
+        }
+        print(f"\n{mode.capitalize()} of {dataset_name}: {counts['inserted']} inserted, "
+              f"{counts['updated']} updated, {counts['unchanged']} unchanged"
+              + (f", {counts['skipped']} changed row(s) skipped (append only adds new rows)" if counts['skipped'] else ""))
+        self.report_load_rate(len(writes), dataset_name, start)
+        return counts
+
+    def fetch_row_hashes(self, dataset_name, db_type, match_cols, key_cols):
+        """
+        Reads the match columns and the stored row hash of every row in the dataset.
+        Datasets uploaded before row hashes existed get the hash column added (empty, so every
+        keyed row counts as changed once); without a key there is nothing to match them on.
+        """
+        columns = list(dict.fromkeys(match_cols + [ROW_HASH_COLUMN]))
+        if db_type == 'mongo':
+            collection = self.connect_mongo()[dataset_name]
+            docs = list(collection.find({}, {**{col: 1 for col in columns}, '_id': 0}))
+            existing = pd.DataFrame(docs, columns=columns)
+            if not key_cols and len(existing) and existing[ROW_HASH_COLUMN].isna().all():
+                raise ValueError(f"{dataset_name} was uploaded without row hashes, choose a key column")
+            return existing
+
+        quote = '`' if db_type == 'sql' else '"'
+        if db_type == 'sql':
+            cnx = self.connect_mysql()
+            cursor = cnx.cursor()
+        else:
+            cnx = cursor = self.connect_duckdb()
+        try:
+            cursor.execute(f"DESCRIBE {dataset_name}")
+            table_columns = [row[0] for row in cursor.fetchall()]
+            if ROW_HASH_COLUMN not in table_columns:
+                if not key_cols:
+                    raise ValueError(f"{dataset_name} was uploaded without row hashes, choose a key column")
+                cursor.execute(f"ALTER TABLE {dataset_name} ADD COLUMN {quote}{ROW_HASH_COLUMN}{quote} CHAR(16)")
+            cursor.execute(f"SELECT {', '.join(quote + col + quote for col in columns)} FROM {dataset_name}")
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+        finally:
+            cnx.close()
+
+    # source: https://dev.mysql.com/doc/refman/8.0/en/update.html (multiple-table syntax)
+    def write_incremental_sql(self, new, changed, table_name, match_cols, existing_dataset):
+        cnx = self.connect_mysql()
+        try:
+            cursor = cnx.cursor()
+            if not existing_dataset:
+                cursor.execute(self.generate_create_table_stmt(new, table_name))
+            cursor.execute(f"DESCRIBE {table_name}")
+            column_types = {row[0]: row[1].decode() if isinstance(row[1], (bytes, bytearray)) else row[1]
+                            for row in cursor.fetchall()}
+            extra = [col for col in new.columns if col not in column_types]
+            if extra:
+                raise ValueError(f"column(s) not in {table_name}: {', '.join(extra)}, use a replace upload")
+            # the exact types of the last replace upload may not hold the new values
+            self.widen_sql_columns(cursor, table_name, pd.concat([new, changed]), column_types)
+            if not changed.empty:
+                # changed rows are matched by key, an index on it keeps the UPDATE join from scanning.
+                # it is built on another pooled connection, so before this one writes anything:
+                # CREATE INDEX would wait for the metadata lock an uncommitted INSERT holds
+                cnx.commit()
+                self.invalidate_schema(table_name, 'sql')
+                self.create_sql_indexes(table_name, [tuple(match_cols)])
+
+            columns = ', '.join(f"`{col}`" for col in new.columns)
+            placeholders = ', '.join(['%s'] * len(new.columns))
+            if not new.empty:
+                self.insert_sql_batches(cnx, cursor, new, table_name,
+                                        insert_stmt=f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})")
+            if not changed.empty:
+                # changed rows are matched by key through a temporary table, so the key needs
+                # no unique index (and a table that already repeats a key still works)
+                changes = f"{table_name}_changes"
+                cursor.execute(f"CREATE TEMPORARY TABLE {changes} LIKE {table_name}")
+                try:
+                    self.insert_sql_batches(cnx, cursor, changed, changes,
+                                            insert_stmt=f"INSERT INTO {changes} ({columns}) VALUES ({placeholders})")
+                    condition = ' AND '.join(f"t.`{col}` <=> c.`{col}`" for col in match_cols)
+                    updates = ', '.join(f"t.`{col}` = c.`{col}`" for col in changed.columns if col not in match_cols)
+                    cursor.execute(f"UPDATE {table_name} t JOIN {changes} c ON {condition} SET {updates}")
+                finally:
+                    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {changes}")
+            cnx.commit()
+        finally:
+            cnx.close()
+
+    def widen_sql_columns(self, cursor, table_name, df, column_types):
+        """
+        Alters the columns of the table that are too narrow for the incoming rows (a longer
+        name, a new ENUM value, a bigger number) before any row is written, so strict mode
+        can't stop the load halfway. Returns the new column types.
+        """
+        widened = {}
+        for col in df.columns:
+            if col == ROW_HASH_COLUMN:
+                continue
+            wider = self.widened_sql_type(column_types[col], df[col], col)
+            if wider is None:
+                continue
+            if wider == 'CONFLICT':
+                raise ValueError(f"column {col} is {column_types[col]} in {table_name} but the file has "
+                                 f"{self.profile_column(df[col], col)} values, use a replace upload")
+            widened[col] = wider
+        if widened:
+            cursor.execute(f"ALTER TABLE {table_name} "
+                           + ', '.join(f"MODIFY `{col}` {sql_type}" for col, sql_type in widened.items()))
+            print(f"\nWidened {', '.join(f'{col} to {sql_type}' for col, sql_type in widened.items())} for the new rows")
+        return widened
+
+    def widened_sql_type(self, current, series, column_name):
+        """
+        Returns the type a column of type `current` (as DESCRIBE shows it) needs to also hold the
+        values of series, None when it already does, 'CONFLICT' for a different kind of data.
+        """
+        values = series.dropna()
+        if values.empty:
+            return None
+        base = self.base_sql_type(current)
+        # the length of a VARCHAR/CHAR, the precision and scale of a DECIMAL
+        sizes = []
+        if '(' in current and base not in ('enum', 'set'):
+            sizes = [int(size) for size in re.findall(r'\d+', current.split('(', 1)[1])]
+        needed = self.profile_column(series, column_name)
+        needed_base = self.base_sql_type(needed)
+        # value range and digits before the decimal point of each integer type
+        integer_ranges = {
+            'tinyint': (-2 ** 7, 2 ** 7 - 1),
+            'smallint': (-2 ** 15, 2 ** 15 - 1),
+            'mediumint': (-2 ** 23, 2 ** 23 - 1),
+            'int': (-2 ** 31, 2 ** 31 - 1),
+            'bigint': (-2 ** 63, 2 ** 63 - 1),
+            'year': (1901, 2155)
         }
+        integer_digits = {'tinyint': 3, 'smallint': 5, 'mediumint': 7, 'int': 10, 'bigint': 19, 'year': 4}
+        integer_types = ('tinyint', 'smallint', 'mediumint', 'int', 'bigint')
+
+        if base in integer_digits:
+            if needed_base == 'boolean':
+                return None
+            if needed_base in integer_types or needed_base == 'year':
+                low, high = int(values.min()), int(values.max())
+                low_limit, high_limit = integer_ranges[base]
+                if 'unsigned' in current:
+                    low_limit, high_limit = 0, 2 * high_limit + 1
+                if low_limit <= low and high <= high_limit:
+                    return None
+                # wide enough for the stored values as well as the new ones
+                return self.integer_type(min(low, low_limit), max(high, high_limit))
+            if needed_base == 'decimal':
+                precision, scale = [int(size) for size in re.findall(r'\d+', needed)]
+                digits = max(integer_digits[base], precision - scale)
+                return f"DECIMAL({digits + scale},{scale})" if digits + scale <= 65 else 'DOUBLE'
+            return 'DOUBLE' if needed_base == 'double' else 'CONFLICT'
+
+        if base == 'decimal':
+            precision, scale = (sizes + [10, 0])[:2]
+            if needed_base in integer_types or needed_base == 'year':
+                needed_digits, needed_scale = len(str(int(values.abs().max()))), 0
+            elif needed_base == 'decimal':
+                needed_precision, needed_scale = [int(size) for size in re.findall(r'\d+', needed)]
+                needed_digits = needed_precision - needed_scale
+            elif needed_base == 'double':
+                return 'DOUBLE'
+            else:
+                return 'CONFLICT'
+            digits, new_scale = max(precision - scale, needed_digits), max(scale, needed_scale)
+            if (digits, new_scale) == (precision - scale, scale):
+                return None
+            return f"DECIMAL({digits + new_scale},{new_scale})" if digits + new_scale <= 65 else 'DOUBLE'
+
+        if base in ('double', 'float'):
+            return None if pd.api.types.is_numeric_dtype(series) else 'CONFLICT'
+
+        if base in ('date', 'datetime', 'timestamp'):
+            if needed_base not in ('date', 'datetime'):
+                return 'CONFLICT'
+            return 'DATETIME' if base == 'date' and needed_base == 'datetime' else None
+
+        text = values.astype(str)
+        if base == 'enum':
+            members = [member.replace("''", "'") for member in re.findall(r"'((?:[^']|'')*)'", current)]
+            added = [val for val in sorted(set(text)) if val not in members]
+            if not added:
+                return None
+            members += added
+            if len(members) <= ENUM_MAX_VALUES:
+                # MySQL sorts an ENUM by member position, so the members stay in the order ORDER BY
+                # would give the text (the ALTER maps the stored values over by label)
+                members.sort(key=str.lower)
+                return "ENUM(" + ', '.join("'" + val.replace('\\', '\\\\').replace("'", "''") + "'" for val in members) + ")"
+            max_length = max(len(member) for member in members)
+            return f"VARCHAR({max_length})" if max_length <= VARCHAR_MAX_LENGTH else 'TEXT'
+        if base in ('varchar', 'char') and sizes:
+            max_length = int(text.str.len().max())
+            if max_length <= sizes[0]:
+                return None
+            return f"VARCHAR({max_length})" if max_length <= VARCHAR_MAX_LENGTH else 'TEXT'
+        return None
+
+    def write_incremental_duckdb(self, new, changed, table_name, match_cols, existing_dataset):
+        con = self.connect_duckdb()
+        try:
+            con.register('new_df', new)
+            if not existing_dataset:
+                con.execute(f"CREATE TABLE {table_name} AS SELECT * FROM new_df")
+                return
+            self.widen_duckdb_columns(con, table_name, pd.concat([new, changed]))
+            if not changed.empty:
+                # updated in place by key, every row with that key gets the new values
+                con.register('changed_df', changed)
+                condition = ' AND '.join(f'{table_name}."{col}" IS NOT DISTINCT FROM changed_df."{col}"' for col in match_cols)
+                updates = ', '.join(f'"{col}" = changed_df."{col}"' for col in changed.columns if col not in match_cols)
+                con.execute(f"UPDATE {table_name} SET {updates} FROM changed_df WHERE {condition}")
+                con.unregister('changed_df')
+            if not new.empty:
+                con.execute(f"INSERT INTO {table_name} BY NAME SELECT * FROM new_df")
+        finally:
+            con.close()
+
+    def widen_duckdb_columns(self, con, table_name, df):
+        # duckdb types come from the first upload's dtypes: an integer column would round
+        # fractions and a numeric one can't take text, so those columns are widened first
+        column_types = {row[0]: row[1] for row in con.execute(f"DESCRIBE {table_name}").fetchall()}
+        for col in df.columns:
+            current = column_types.get(col, '')
+            values = df[col].dropna()
+            if values.empty or col == ROW_HASH_COLUMN:
+                continue
+            numeric = current in ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT', 'FLOAT', 'DOUBLE') or current.startswith('DECIMAL')
+            if numeric and not pd.api.types.is_numeric_dtype(values):
+                wider = 'VARCHAR'
+            elif current in ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT') and not (values % 1 == 0).all():
+                wider = 'DOUBLE'
+            else:
+                continue
+            con.execute(f'ALTER TABLE {table_name} ALTER "{col}" TYPE {wider}')
+            print(f"\nWidened {col} to {wider} for the new rows")
+
+    # source: https://pymongo.readthedocs.io/en/stable/api/pymongo/operations.html#pymongo.operations.UpdateMany
+    def write_incremental_mongo(self, df, collection_name, match_cols, mode):
+        collection = self.connect_mongo()[collection_name]
+        # every upsert looks its document up by the key
+        collection.create_index([(col, 1) for col in match_cols])
+        if mode == 'upsert':
+            # every document with that key gets the new values, like the sql backends
+            def make_request(doc):
+                return pymongo.UpdateMany({col: doc[col] for col in match_cols}, {'$set': doc}, upsert=True)
+        else:
+            # append: only inserts, an existing document is never touched
+            def make_request(doc):
+                return pymongo.UpdateOne({col: doc[col] for col in match_cols}, {'$setOnInsert': doc}, upsert=True)
+        self.bulk_write_mongo(collection, df, make_request=make_request)
+
+    def generate_create_table_stmt(self, df, table_name, exact=True):
+        # every column gets the narrowest type that fits its values (see profile_column)
         columns = []
-        for col, dtype in df.dtypes.items():
-            sql_type = dtype_map.get(str(dtype), 'VARCHAR(255)')
+        for col in df.columns:
+            # the row hash is always 16 hex digits
+            sql_type = 'CHAR(16)' if col == ROW_HASH_COLUMN else self.profile_column(df[col], col, exact)
             columns.append(f"`{col}` {sql_type}")
         return f"CREATE TABLE {table_name} ({', '.join(columns)})"
 
+    def clean_dataframe(self, df):
+        """
+        Converts text columns whose values are all numbers written with thousands
+        separators or currency symbols (e.g. "101,200", "$1,299.99") into numeric columns.
+        Placeholders like "-" or "N/A" become missing values.
+        """
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+                continue
+            values = series.dropna().astype(str)
+            values = values[~values.str.strip().isin(MISSING_TEXT_VALUES)]
+            if values.empty:
+                continue
+            if values.str.match(NUMERIC_TEXT_PATTERN).all():
+                df[col] = self.to_number(series)
+        return df
+
+    def to_number(self, series):
+        # drop currency symbols, thousands separators, bounds markers and spaces,
+        # anything else unparsable becomes NaN
+        stripped = series.astype(str).str.replace(r'[$€£¥,\s+<>~]', '', regex=True)
+        return pd.to_numeric(stripped.where(series.notna()), errors='coerce')
+
+    # source: https://dev.mysql.com/doc/refman/8.0/en/storage-requirements.html
+    def profile_column(self, series, column_name, exact=True):
+        """
+        Picks the narrowest MySQL type for a column from its values: TINYINT..BIGINT,
+        YEAR, DECIMAL, DOUBLE, DATE/DATETIME, ENUM, sized VARCHAR or TEXT.
+        With exact=False (types taken from a sample) integers, decimals and text get headroom
+        and no ENUMs are made, so unseen values still fit.
+        """
+        values = series.dropna()
+        if pd.api.types.is_bool_dtype(series):
+            return 'BOOLEAN'
+        if values.empty:
+            return 'VARCHAR(255)'
+
+        if pd.api.types.is_datetime64_any_dtype(series):
+            # no time part anywhere means a plain DATE is enough
+            return 'DATE' if (values.dt.normalize() == values).all() else 'DATETIME'
+
+        if pd.api.types.is_numeric_dtype(series):
+            # whole numbers (floats here only because of missing values) get an integer type
+            if pd.api.types.is_integer_dtype(series) or (values % 1 == 0).all():
+                low, high = int(values.min()), int(values.max())
+                if exact and 'year' in column_name.lower() and 1901 <= low and high <= 2155:
+                    return 'YEAR'
+                return self.integer_type(low, high, exact)
+            if exact:
+                scale = self.decimal_scale(values)
+                if scale is not None:
+                    digits = len(str(int(values.abs().max())))
+                    return f"DECIMAL({digits + scale},{scale})"
+            return 'DOUBLE'
+
+        text = values.astype(str)
+        if text.str.match(ISO_DATE_PATTERN).all() and pd.to_datetime(text, format='%Y-%m-%d', errors='coerce').notna().all():
+            return 'DATE'
+        if text.str.match(ISO_DATETIME_PATTERN).all() and pd.to_datetime(text, format='ISO8601', errors='coerce').notna().all():
+            return 'DATETIME'
+
+        max_length = max(1, int(text.str.len().max()))
+        if exact:
+            distinct = text.unique()
+            # low cardinality text becomes an ENUM, unless values would clash under the case-insensitive collation
+            if (len(distinct) <= ENUM_MAX_VALUES and len(distinct) * 2 <= len(text)
+                    and len({val.strip().lower() for val in distinct}) == len(distinct)):
+                # members in text order, MySQL sorts an ENUM column by member position
+                members = ', '.join("'" + val.replace('\\', '\\\\').replace("'", "''") + "'" for val in sorted(distinct, key=str.lower))
+                return f"ENUM({members})"
+        else:
+            max_length = max(255, max_length * 2)
+
+        if max_length > VARCHAR_MAX_LENGTH:
+            return 'TEXT'
+        return f"VARCHAR({max_length})"
+
+    def integer_type(self, low, high, exact=True):
+        # signed ranges of the mysql integer types, smallest first
+        ranges = [
+            ('TINYINT', -2 ** 7, 2 ** 7 - 1),
+            ('SMALLINT', -2 ** 15, 2 ** 15 - 1),
+            ('INT', -2 ** 31, 2 ** 31 - 1),
+            ('BIGINT', -2 ** 63, 2 ** 63 - 1)
+        ]
+        if not exact:
+            # a sample's range says little about the full file, so start at INT
+            ranges = ranges[2:]
+        for sql_type, min_value, max_value in ranges:
+            if min_value <= low and high <= max_value:
+                return sql_type
+        return 'DECIMAL(65,0)'
+
+    def decimal_scale(self, values):
+        # smallest number of decimal places that represents every value exactly, None if too many
+        for scale in range(DECIMAL_MAX_SCALE + 1):
+            scaled = values * 10 ** scale
+            if ((scaled - scaled.round()).abs() < 1e-6).all():
+                return scale
+        return None
+
     def show_sample_data(self, dataset_name, db_type):
-        if db_type == 'sql':
-            # Fetch column metadata and sample data from the SQL database
-            columns, data = self.sample_sql_data(dataset_name)
+        if db_type in SQL_ENGINES:
+            # Fetch column metadata and sample data from the schema registry
+            schema = self.get_schema(dataset_name, db_type)
+            columns, data = schema['columns'], schema['sample']
             
             # Extract headers from columns
             headers = []
@@ -281,8 +2051,9 @@ class ChatDB:
                 print(" | ".join(formatted_row))
         
         else:
-            # Fetch column metadata and sample data from the MongoDB database
-            columns, data = self.sample_mongo_data(dataset_name)
+            # Fetch column metadata and sample data from the schema registry
+            schema = self.get_schema(dataset_name, db_type)
+            columns, data = schema['columns'], schema['sample']
             
             # Extract headers from columns
             headers = []
@@ -290,9 +2061,13 @@ class ChatDB:
                 headers.append(col[0])
             
             print("\nColumns:")
-            # Print column names and their data types
+            # Print field names, their data types and how often they are missing
             for col in columns:
-                print(f"{col[0]} ({col[1]})")
+                null_ratio = schema['profile'].get(col[0], {}).get('null_ratio', 0)
+                if null_ratio:
+                    print(f"{col[0]} ({col[1]}, {null_ratio:.0%} null)")
+                else:
+                    print(f"{col[0]} ({col[1]})")
             
             print("\nSample Data (5 rows):")
             # Print header row
@@ -309,16 +2084,69 @@ class ChatDB:
         # Prompt the user for further actions
         print("\nType 'commands' to get a list of available commands")
 
+    def get_schema(self, dataset_name, db_type):
+        """
+        Returns the registry entry for a dataset, loading it from the database the first time.
+        Holds the column (name, type) pairs, the sample rows, the column names and the
+        numeric/text column groupings used by the query generators.
+        """
+        key = (db_type, dataset_name)
+        if key not in self.schemas:
+            if db_type == 'sql':
+                columns, sample = self.sample_sql_data(dataset_name)
+                numeric = self.extract_columns_by_type(columns, ('tinyint', 'smallint', 'mediumint', 'int', 'bigint', 'year', 'float', 'double', 'decimal'))
+                text = self.extract_columns_by_type(columns, ('varchar', 'text', 'char', 'enum'))
+            elif db_type == 'duckdb':
+                columns, sample = self.sample_duckdb_data(dataset_name)
+                numeric = self.extract_columns_by_type(columns, ('tinyint', 'smallint', 'integer', 'bigint', 'hugeint', 'float', 'double', 'decimal'))
+                text = self.extract_columns_by_type(columns, ('varchar',))
+            else:
+                columns, sample, profile = self.sample_mongo_data(dataset_name)
+                numeric = self.extract_fields_by_type(columns, MONGO_NUMERIC_TYPES)
+                text = self.extract_fields_by_type(columns, MONGO_TEXT_TYPES)
+
+            self.schemas[key] = {
+                'columns': columns,
+                'sample': sample,
+                'names': self.extract_column_names(columns),
+                'numeric': numeric,
+                'text': text,
+                # per-field type frequencies and null ratios (mongo only)
+                'profile': profile if db_type == 'mongo' else {},
+                # upload-time column statistics used to pick query parameters
+                'stats': self.load_column_stats(dataset_name, db_type)
+            }
+        return self.schemas[key]
+
+    def invalidate_schema(self, dataset_name, db_type):
+        # forget the registry entry so the next lookup reloads it
+        self.schemas.pop((db_type, dataset_name), None)
+
+    @traced
     def sample_sql_data(self, table_name):
         cnx = self.connect_mysql()
         cursor = cnx.cursor()
         cursor.execute(f"DESCRIBE {table_name}")
-        columns = cursor.fetchall()
-        cursor.execute(f"SELECT * FROM {table_name} LIMIT 5")
+        # the row hash is upload bookkeeping, not data
+        columns = [col for col in cursor.fetchall() if col[0] != ROW_HASH_COLUMN]
+        cursor.execute(f"SELECT {', '.join(f'`{col[0]}`' for col in columns)} FROM {table_name} LIMIT 5")
         sample_data = cursor.fetchall()
         cnx.close()
         return columns, sample_data
 
+    @traced
+    def sample_duckdb_data(self, table_name):
+        # DESCRIBE rows start with (column_name, column_type) like mysql's
+        con = self.connect_duckdb()
+        try:
+            columns = [col for col in con.execute(f"DESCRIBE {table_name}").fetchall() if col[0] != ROW_HASH_COLUMN]
+            select_list = ', '.join('"' + col[0] + '"' for col in columns)
+            sample_data = con.execute(f"SELECT {select_list} FROM {table_name} LIMIT 5").fetchall()
+        finally:
+            con.close()
+        return columns, sample_data
+
+    @traced
     def sample_mongo_data(self, collection_name):
         # Connect to MongoDB and access the specified collection
         db = self.connect_mongo()
@@ -329,43 +2157,138 @@ class ChatDB:
 
         # If no data is found, return empty structures for columns and data
         if not sample_data:
-            return [], []
+            return [], [], {}
+
+        # Field types come from a server-side profile of the whole collection, not one document
+        profile = self.profile_mongo_schema(collection)
+
+        # Keep the field order of the sample documents, fields they don't have go last
+        field_names = []
+        for doc in sample_data:
+            for key in doc:
+                if key not in ('_id', ROW_HASH_COLUMN) and key not in field_names:
+                    field_names.append(key)
+        for key in sorted(profile):
+            if key not in field_names and key != ROW_HASH_COLUMN:
+                field_names.append(key)
 
-        # Extract column names and types, excluding the '_id' field
         columns = []
-        for key, value in sample_data[0].items():
-            if key != '_id':
-                columns.append((key, type(value).__name__))
+        for name in field_names:
+            columns.append((name, profile.get(name, {}).get('type', 'null')))
 
         # Format sample data into tuples based on the extracted columns
+        # (documents may not have every field)
         formatted_data = []
         for doc in sample_data:
             row = []
             for col in columns:
-                row.append(doc[col[0]])
+                row.append(doc.get(col[0]))
             formatted_data.append(tuple(row))
 
-        # Return the extracted column metadata and formatted data
-        return columns, formatted_data
+        # Return the extracted column metadata, formatted data and the profile
+        return columns, formatted_data, profile
+
+    # source: https://www.mongodb.com/docs/manual/reference/operator/aggregation/type/
+    def profile_mongo_schema(self, collection, sample_size=MONGO_SCHEMA_SAMPLE_SIZE):
+        """
+        Builds the union schema of a collection on the server: $sample picks random documents,
+        $objectToArray/$type count every field's bson types. Returns
+        {field: {'types': {type: count}, 'null_ratio': float, 'type': str}} where 'type' is the
+        field's single non-null type, or 'mixed(...)' when values disagree.
+        """
+        pipeline = [
+            # $sample reads random documents instead of scanning when the size is small
+            {'$sample': {'size': sample_size}},
+            {'$facet': {
+                'documents': [{'$count': 'count'}],
+                'types': [
+                    {'$project': {'fields': {'$objectToArray': '$$ROOT'}}},
+                    {'$unwind': '$fields'},
+                    {'$match': {'fields.k': {'$ne': '_id'}}},
+                    {'$group': {
+                        '_id': {
+                            'field': '$fields.k',
+                            # NaN (how pandas writes missing numbers) sorts below -Infinity, count it as missing
+                            'type': {'$cond': [
+                                {'$and': [
+                                    {'$eq': [{'$type': '$fields.v'}, 'double']},
+                                    {'$lt': ['$fields.v', float('-inf')]}
+                                ]},
+                                'nan',
+                                {'$type': '$fields.v'}
+                            ]}
+                        },
+                        'count': {'$sum': 1}
+                    }}
+                ]
+            }}
+        ]
+        try:
+            result = next(collection.aggregate(pipeline), {'documents': [], 'types': []})
+            sampled = result['documents'][0]['count'] if result['documents'] else 0
+            counts = {(entry['_id']['field'], entry['_id']['type']): entry['count'] for entry in result['types']}
+        except pymongo.errors.OperationFailure:
+            # servers (and stand-ins) without $objectToArray/$type: count the types here instead
+            documents = list(collection.aggregate([{'$sample': {'size': sample_size}}]))
+            sampled = len(documents)
+            counts = Counter((name, self.bson_type_name(value))
+                             for document in documents for name, value in document.items() if name != '_id')
+
+        profile = {}
+        for (name, type_name), count in counts.items():
+            field = profile.setdefault(name, {'types': {}})
+            field['types'][type_name] = count
+
+        for field in profile.values():
+            present = {name: count for name, count in field['types'].items() if name not in ('null', 'nan')}
+            # missing from a document counts as null too
+            field['null_ratio'] = (sampled - sum(present.values())) / sampled if sampled else 0
+            if not present:
+                field['type'] = 'null'
+            elif all(name in MONGO_NUMERIC_TYPES for name in present):
+                # ints and doubles mixed together are still one numeric field
+                field['type'] = max(present, key=present.get)
+            elif len(present) == 1:
+                field['type'] = next(iter(present))
+            else:
+                field['type'] = f"mixed({', '.join(sorted(present))})"
+        return profile
+
+    def bson_type_name(self, value):
+        # the name $type gives a value, with NaN apart like the server pipeline does
+        # source: https://www.mongodb.com/docs/manual/reference/operator/aggregation/type/
+        names = {'NoneType': 'null', 'bool': 'bool', 'str': 'string', 'dict': 'object', 'list': 'array',
+                 'datetime': 'date', 'ObjectId': 'objectId', 'Decimal128': 'decimal', 'Int64': 'long',
+                 'bytes': 'binData'}
+        name = type(value).__name__
+        if name in names:
+            return names[name]
+        if isinstance(value, int):
+            return 'int' if -2**31 <= value < 2**31 else 'long'
+        if isinstance(value, float):
+            return 'nan' if value != value else 'double'
+        return name
 
     def generate_query(self, dataset_name, db_type, query_type = None):
-        if db_type == 'sql':
-            return self.generate_sql_queries(dataset_name, query_type)
+        if db_type in SQL_ENGINES:
+            # duckdb runs the same SQL templates as mysql
+            return self.generate_sql_queries(dataset_name, query_type, db_type)
         else:
             return self.generate_mongo_queries(dataset_name, query_type)
     
-    def generate_sql_queries(self, table_name, query_type=None):
-        # Retrieve column metadata and split into column name and types
-        columns, _ = self.sample_sql_data(table_name)
+    @traced
+    def generate_sql_queries(self, table_name, query_type=None, db_type='sql'):
+        # Retrieve the column groupings from the schema registry (no database I/O once it is loaded)
+        schema = self.get_schema(table_name, db_type)
         
-        # Extract all column names from data
-        cols = self.extract_column_names(columns)
+        # All column names from data
+        cols = schema['names']
         
-        # Extract numeric columns (e.g., int, float)
-        numeric_cols = self.extract_columns_by_type(columns, ('int', 'float', 'double', 'decimal'))
+        # Numeric columns (e.g., int, decimal)
+        numeric_cols = schema['numeric']
         
-        # Extract text columns (e.g., varchar, text)
-        text_cols = self.extract_columns_by_type(columns, ('varchar', 'text', 'char'))
+        # Text columns (e.g., varchar, enum)
+        text_cols = schema['text']
         
         # Fallback to all columns if no numeric or text columns are found
         if not numeric_cols:
@@ -384,7 +2307,7 @@ class ChatDB:
             if query_type in patterns:
                 pattern_list = patterns[query_type]
                 for pattern in pattern_list:
-                    params = self.generate_query_parameters(cols, numeric_cols, text_cols, table_name)
+                    params = self.generate_query_parameters(cols, numeric_cols, text_cols, table_name, schema['stats'])
                     
                     # Format the SQL template with dynamic parameters
                     query = pattern['template'].format(**params)
@@ -395,20 +2318,25 @@ class ChatDB:
                     # Append the generated query and its description
                     queries.append({
                         'description': description,
-                        'query': query
+                        'query': query,
+                        'columns': self.sql_column_usage(pattern['template'], params)
                     })
         else:
             # For mixed queries, take one random pattern from each type
             for pattern_list in patterns.values():
                 pattern = random.choice(pattern_list)
-                params = self.generate_query_parameters(cols, numeric_cols, text_cols, table_name)
+                params = self.generate_query_parameters(cols, numeric_cols, text_cols, table_name, schema['stats'])
                 
                 # Format the SQL template and description
                 query = pattern['template'].format(**params)
                 description = pattern['description'].format(**params)
                 
                 # Append the generated query and its description
-                queries.append({'description': description, 'query': query})
+                queries.append({
+                    'description': description,
+                    'query': query,
+                    'columns': self.sql_column_usage(pattern['template'], params)
+                })
 
         # Ensure exactly 5 queries by duplicating if necessary
         while len(queries) < 5:
@@ -416,6 +2344,27 @@ class ChatDB:
         
         return queries[:5]  # Return only the first 5 queries
 
+    def sql_column_usage(self, template, params):
+        """
+        Works out which columns a generated query filters, groups, sorts and aggregates on,
+        from the placeholders in each clause of its template.
+        """
+        usage = {'filter': [], 'group': [], 'sort': [], 'aggregate': []}
+        # the select list comes first, then each keyword is followed by its clause
+        parts = re.split(r'\b(WHERE|GROUP BY|HAVING|ORDER BY|LIMIT)\b', template)
+        for name in re.findall(r'(?:SUM|AVG|MIN|MAX)\(\{(\w+)\}\)', parts[0]):
+            usage['aggregate'].append(params[name])
+        roles = {'WHERE': 'filter', 'GROUP BY': 'group', 'ORDER BY': 'sort'}
+        for keyword, clause in zip(parts[1::2], parts[2::2]):
+            # LIKE '%...%' can't use an index, so it isn't worth recording
+            if keyword not in roles or (keyword == 'WHERE' and 'LIKE' in clause):
+                continue
+            for name in re.findall(r'\{(\w+)\}', clause):
+                # only placeholders that hold column names, not thresholds or the table
+                if name in SQL_COLUMN_PARAMS:
+                    usage[roles[keyword]].append(params[name])
+        return usage
+
     # extract column names
     def extract_column_names(self, columns):
         """Extracts the first element (column name) from a list of column tuples."""
@@ -432,9 +2381,15 @@ class ChatDB:
         """
         filtered_columns = []
         for col in columns:
-            if col[1].lower() in data_types:
+            if self.base_sql_type(col[1]) in data_types:
                 filtered_columns.append(col[0])
         return filtered_columns
+
+    def base_sql_type(self, sql_type):
+        # DESCRIBE reports e.g. "varchar(42)", "decimal(5,2)" or "int unsigned", keep only the type name
+        if isinstance(sql_type, (bytes, bytearray)):
+            sql_type = sql_type.decode()
+        return sql_type.split('(')[0].split()[0].lower()
     
     def get_query_patterns(self):
         return {
@@ -458,8 +2413,8 @@ class ChatDB:
                     'description': "Groups with more than {min_count} items"
                 },
                 {
-                    'template': "SELECT {group_col}, SUM({numeric_col}) as total FROM {table} GROUP BY {group_col} HAVING total > {threshold}",
-                    'description': "Groups with total {numeric_col} exceeding {threshold}"
+                    'template': "SELECT {group_col}, SUM({numeric_col}) as total FROM {table} GROUP BY {group_col} HAVING total > {total_threshold}",
+                    'description': "Groups with total {numeric_col} exceeding {total_threshold}"
                 }
             ],
             'order_by': [
@@ -525,23 +2480,80 @@ class ChatDB:
         }
 
     # Helper function: Generate query parameters
-    def generate_query_parameters(self, cols, numeric_cols, text_cols, table_name):
+    def generate_query_parameters(self, cols, numeric_cols, text_cols, table_name, stats=None):
+        stats = stats or {}
+        group_col = random.choice(text_cols)
+        numeric_col = random.choice(numeric_cols)
+        text_col = random.choice(text_cols)
+        # a statistic of 0 is a real threshold (mostly-zero or negative columns), only None falls back
+        min_count = self.group_count_threshold(stats.get(group_col))
+        threshold = self.numeric_threshold(stats.get(numeric_col))
+        total_threshold = self.group_total_threshold(stats.get(group_col), stats.get(numeric_col))
         params = {
             'table': table_name,
-            'group_col': random.choice(text_cols),
-            'numeric_col': random.choice(numeric_cols),
-            'text_col': random.choice(text_cols),
+            'group_col': group_col,
+            'numeric_col': numeric_col,
+            'text_col': text_col,
             'ord_col': random.choice(cols),
             'ord_col1': random.choice(cols),
             'ord_col2': random.choice([c for c in cols if c != random.choice(cols)]),
             'col': random.choice(cols),
-            'min_count': random.randint(2, 5),
-            'threshold': random.randint(10, 100),
+            'min_count': min_count if min_count is not None else random.randint(2, 5),
+            'threshold': threshold if threshold is not None else random.randint(10, 100),
+            'total_threshold': total_threshold if total_threshold is not None else random.randint(10, 100),
             'limit': random.randint(5, 10),
-            'pattern': random.choice(['A%', '%B', '%C%'])
+            'pattern': self.text_pattern(stats.get(text_col)) or random.choice(['A%', '%B', '%C%'])
         }
         return params
-    
+
+    def numeric_threshold(self, col_stats, selectivity=TARGET_SELECTIVITY):
+        """
+        Value a "> threshold" filter should use so about `selectivity` of the rows match,
+        read from the column's stored quantiles. None when there are no statistics.
+        """
+        if not col_stats or 'quantiles' not in col_stats:
+            return None
+        # the closest stored quantile to 1 - selectivity
+        target = min(col_stats['quantiles'], key=lambda q: abs(float(q) - (1 - selectivity)))
+        value = col_stats['quantiles'][target]
+        return int(value) if float(value).is_integer() else round(value, 2)
+
+    def group_count_threshold(self, col_stats, selectivity=TARGET_SELECTIVITY):
+        # HAVING count > n that keeps about `selectivity` of the groups, from the top value counts
+        if not col_stats or not col_stats.get('top') or not col_stats.get('distinct'):
+            return None
+        keep = max(1, int(col_stats['distinct'] * selectivity))
+        counts = [count for _, count in col_stats['top']]
+        if keep <= len(counts):
+            return max(1, counts[keep - 1] - 1)
+        # past the stored top values, use the average group size
+        return max(1, (col_stats['rows'] - col_stats['nulls']) // col_stats['distinct'])
+
+    def group_total_threshold(self, group_stats, numeric_stats, selectivity=TARGET_SELECTIVITY):
+        # HAVING SUM > n: an average sized group of high values, so only the heavier groups pass
+        value = self.numeric_threshold(numeric_stats, selectivity)
+        if value is None or not group_stats or not group_stats.get('distinct'):
+            return None
+        group_size = max(1, group_stats['rows'] // group_stats['distinct'])
+        return round(value * group_size, 2)
+
+    def text_pattern(self, col_stats):
+        # LIKE pattern taken from a frequent value, so the filter matches something but not everything
+        candidates = self.text_pattern_candidates(col_stats)
+        return random.choice(candidates) if candidates else None
+
+    def text_pattern_candidates(self, col_stats):
+        # a fragment of one word of each frequent value, quotes/wildcards removed so it stays a plain LIKE literal
+        if not col_stats or not col_stats.get('top'):
+            return []
+        candidates = []
+        for val, _ in col_stats['top']:
+            if isinstance(val, str) and val.strip():
+                word = re.sub(r"[%_'\\]", '', val.split()[0])[:4]
+                if word:
+                    candidates.append(word)
+        return candidates
+
     # Helper function: Extract field names
     def extract_field_names(self, columns):
         field_names = []
@@ -561,18 +2573,19 @@ class ChatDB:
                 filtered_fields.append(col[0])
         return filtered_fields
     
+    @traced
     def generate_mongo_queries(self, collection_name, query_type=None):
-        # Retrieve column metadata and split into names and types
-        columns, _ = self.sample_mongo_data(collection_name)
+        # Retrieve the field groupings from the schema registry (no database I/O once it is loaded)
+        schema = self.get_schema(collection_name, 'mongo')
         
-        # Extract all field names
-        fields = self.extract_field_names(columns)
+        # All field names
+        fields = schema['names']
         
-        # Extract numeric fields
-        numeric_fields = self.extract_fields_by_type(columns, ('int', 'float'))
+        # Numeric fields
+        numeric_fields = schema['numeric']
         
-        # Extract text fields
-        text_fields = self.extract_fields_by_type(columns, ('str', 'string'))
+        # Text fields
+        text_fields = schema['text']
         
         # Fallback to all fields if no numeric or text fields are found
         if not numeric_fields:
@@ -581,7 +2594,7 @@ class ChatDB:
             text_fields = fields
         
         # Define MongoDB query patterns for different query types
-        patterns = self.get_mongo_query_patterns(fields, numeric_fields, text_fields)
+        patterns = self.get_mongo_query_patterns(fields, numeric_fields, text_fields, schema['stats'])
         
         # Generate queries based on the query type
         if query_type and query_type in patterns:
@@ -603,12 +2616,32 @@ class ChatDB:
             # Return 5 randomly selected queries
             return random.sample(all_queries, 5)
     
-    def get_mongo_query_patterns(self, fields, numeric_fields, text_fields):
+    def get_mongo_query_patterns(self, fields, numeric_fields, text_fields, stats=None):
+        stats = stats or {}
         chosen_field = random.choice(fields)
         chosen_numeric = random.choice(numeric_fields)
+        # comparison value from the column statistics, 50 when there are none
+        threshold = self.numeric_threshold(stats.get(chosen_numeric))
+        if threshold is None:
+            threshold = 50
         chosen_text = random.choice(text_fields)
         sample_fields = random.sample(fields, min(3, len(fields)))
-        
+        return self.build_mongo_query_patterns({
+            'field': chosen_field,
+            'numeric': chosen_numeric,
+            'threshold': threshold,
+            'text': chosen_text,
+            'sample_fields': sample_fields
+        })
+
+    def build_mongo_query_patterns(self, params):
+        # the pattern dicts for one set of chosen fields (the workload generator passes placeholder tokens)
+        chosen_field = params['field']
+        chosen_numeric = params['numeric']
+        threshold = params['threshold']
+        chosen_text = params['text']
+        sample_fields = params['sample_fields']
+
         return {
             'find': [
                 {
@@ -633,9 +2666,9 @@ class ChatDB:
                 },
                 {
                     'title': "Find with Comparison",
-                    'description': f"Find documents where {chosen_numeric} is greater than 50 to identify significant entries",
-                    'query': {'type': 'find', 'filter': {chosen_numeric: {'$gt': 50}}},
-                    'mongo_command': f"db.collection_name.find({{ {chosen_numeric}: {{ $gt: 50 }} }})"
+                    'description': f"Find documents where {chosen_numeric} is greater than {threshold} to identify significant entries",
+                    'query': {'type': 'find', 'filter': {chosen_numeric: {'$gt': threshold}}},
+                    'mongo_command': f"db.collection_name.find({{ {chosen_numeric}: {{ $gt: {threshold} }} }})"
                 },
                 {
                     'title': "Find with Multiple Criteria",
@@ -644,10 +2677,10 @@ class ChatDB:
                         'type': 'find',
                         'filter': {
                             chosen_field: {'$exists': True},
-                            chosen_numeric: {'$gt': 50}
+                            chosen_numeric: {'$gt': threshold}
                         }
                     },
-                    'mongo_command': f"db.collection_name.find({{ {chosen_field}: {{ $exists: true }}, {chosen_numeric}: {{ $gt: 50 }} }})"
+                    'mongo_command': f"db.collection_name.find({{ {chosen_field}: {{ $exists: true }}, {chosen_numeric}: {{ $gt: {threshold} }} }})"
                 }
             ],
             'projection': [
@@ -727,7 +2760,7 @@ class ChatDB:
                     'query': {
                         'type': 'aggregate',
                         'pipeline': [
-                            {'$match': {chosen_numeric: {'$gt': 50}}},
+                            {'$match': {chosen_numeric: {'$gt': threshold}}},
                             {'$group': {
                                 '_id': f"${chosen_text}",
                                 'count': {'$sum': 1}
@@ -735,97 +2768,952 @@ class ChatDB:
                             {'$sort': {'count': -1}}
                         ]
                     },
-                    'mongo_command': f"db.collection_name.aggregate([{{ $match: {{ {chosen_numeric}: {{ $gt: 50 }} }} }}, {{ $group: {{ _id: '${chosen_text}', count: {{ $sum: 1 }} }} }}, {{ $sort: {{ count: -1 }} }}])"
+                    'mongo_command': f"db.collection_name.aggregate([{{ $match: {{ {chosen_numeric}: {{ $gt: {threshold} }} }} }}, {{ $group: {{ _id: '${chosen_text}', count: {{ $sum: 1 }} }} }}, {{ $sort: {{ count: -1 }} }}])"
                 }
             ]
         }
 
     def execute_query(self, query, dataset_name, db_type):
         try:
-            if db_type == 'sql':
-                self.execute_sql_query(query['query'])
-            else:
+            if db_type not in SQL_ENGINES:
                 print("\nExecuting query...")
-                # MongoDB queries may depend on the dataset name for collection identification
-                self.execute_mongo_query(query['query'], dataset_name)
+            summary = self.fetch_query_summary(query, dataset_name, db_type)
+            self.render_query_summary(summary, db_type)
+        except KeyboardInterrupt:
+            # Ctrl-C stops the query on the server too and goes back to the prompt
+            self.cancel_active_queries()
+            print("\nQuery cancelled")
         except Exception as e:
+            self.print_query_error(e)
+
+    def print_query_error(self, error):
+        # timeouts and refusals are reported apart from real errors
+        if isinstance(error, QueryTimeoutError):
+            print(f"Query timed out: {error}")
+        elif isinstance(error, QueryRefusedError):
+            print(f"Query refused: {error}")
+        else:
             # Catch and handle exceptions that may arise during query execution
-            print(f"Error executing query: {e}")
+            print(f"Error executing query: {error}")
+
+    def register_query(self, db_type, **details):
+        # remember how to reach a running query so an interrupt can kill it on the server
+        token = uuid.uuid4().hex
+        self.active_queries[token] = dict(details, db_type=db_type)
+        return token
+
+    def cancel_active_queries(self):
+        # the queries still running on the worker threads of a concurrent batch or replay
+        for token in list(self.active_queries):
+            self.cancel_query(token)
+
+    def cancel_query(self, token):
+        """
+        Stops one registered query on the server: KILL QUERY on MySQL, an interrupt on DuckDB,
+        killOp on operations tagged with its comment on MongoDB.
+        """
+        details = self.active_queries.pop(token, None)
+        if details is not None:
+            try:
+                if details['db_type'] == 'sql':
+                    # a separate one-off connection, the pool may be busy with the queries being killed
+                    cnx = mysql.connector.connect(**MYSQL_CONFIG)
+                    try:
+                        cnx.cursor().execute(f"KILL QUERY {int(details['connection_id'])}")
+                    finally:
+                        cnx.close()
+                elif details['db_type'] == 'duckdb':
+                    # in-process, so interrupting the connection is enough
+                    details['connection'].interrupt()
+                else:
+                    admin = self.connect_mongo().client.admin
+                    operations = admin.aggregate([
+                        {'$currentOp': {}},
+                        {'$match': {'$or': [
+                            {'command.comment': token},
+                            {'cursor.originatingCommand.comment': token}
+                        ]}}
+                    ])
+                    for operation in operations:
+                        admin.command('killOp', op=operation['opid'])
+            except Exception as e:
+                # best effort, the query may have finished or its server gone away
+                print(f"Could not cancel query: {e}")
+
+    def bump_dataset_version(self, dataset_name, db_type):
+        key = (db_type, dataset_name)
+        self.dataset_versions[key] = self.dataset_versions.get(key, 0) + 1
+
+    def result_cache_key(self, query, dataset_name, db_type):
+        """
+        Builds the result cache key: normalized SQL text or the canonical Mongo query,
+        plus the dataset's current version.
+        """
+        version = self.dataset_versions.get((db_type, dataset_name), 0)
+        if db_type in SQL_ENGINES:
+            # collapse whitespace and drop a trailing semicolon so formatting doesn't matter
+            text = ' '.join(query['query'].split()).rstrip(';')
+        else:
+            text = json.dumps(self.canonicalize_mongo(query['query']), default=str)
+        return (db_type, dataset_name, version, text)
+
+    def canonicalize_mongo(self, value, keep_order=False):
+        # filter key order doesn't matter, but $sort key order does, so only that one keeps its order
+        if isinstance(value, dict):
+            items = value.items() if keep_order else sorted(value.items())
+            return [[key, self.canonicalize_mongo(val, key == '$sort')] for key, val in items]
+        if isinstance(value, (list, tuple)):
+            return [self.canonicalize_mongo(val) for val in value]
+        return value
+
+    def fetch_query_summary(self, query, dataset_name, db_type):
+        # runs a generated query and returns its result summary without printing anything
+        # repeated queries are answered from the result cache
+        self.record_index_usage(query, dataset_name, db_type)
+        key = self.result_cache_key(query, dataset_name, db_type)
+        summary = self.result_cache.get(key)
+        if summary is not None:
+            return summary
+
+        plan = None
+        note = None
+        if EXPLAIN_BEFORE_EXECUTE:
+            # look at the plan first and limit or refuse queries that would scan too much
+            plan = self.explain_query(query, dataset_name, db_type)
+            query, note = self.guard_query(query, plan, db_type)
+
+        if db_type == 'sql':
+            summary = self.fetch_sql_summary(query['query'])
+        elif db_type == 'duckdb':
+            summary = self.fetch_duckdb_summary(query['query'])
+        else:
+            # MongoDB queries depend on the dataset name for collection identification
+            summary = self.fetch_mongo_summary(query['query'], dataset_name)
+        summary = dict(summary, plan=plan, note=note)
+        self.result_cache.put(key, summary)
+        return summary
+
+    @traced
+    def explain_query(self, query, dataset_name, db_type):
+        """
+        Returns {'rows': estimated rows/documents examined (None if unknown), 'indexes': [index names]}.
+        DuckDB plans also have 'measure': 'returned', their rows are the estimated result size.
+        """
+        if db_type == 'sql':
+            return self.explain_sql_query(query['query'])
+        if db_type == 'duckdb':
+            return self.explain_duckdb_query(query['query'])
+        return self.explain_mongo_query(query['query'], dataset_name)
+
+    # source: https://dev.mysql.com/doc/refman/8.0/en/explain-output.html
+    def explain_sql_query(self, query):
+        cnx = self.connect_mysql()
+        try:
+            cursor = cnx.cursor()
+            cursor.execute(f"EXPLAIN FORMAT=JSON {query}")
+            plan = json.loads(cursor.fetchone()[0])
+        finally:
+            cnx.close()
+
+        # every table access in the plan, wherever it is nested (grouping, ordering, ...)
+        tables = self.collect_plan_nodes(plan, 'table_name')
+        rows = sum(int(table.get('rows_examined_per_scan', 0)) for table in tables)
+        indexes = [table['key'] for table in tables if table.get('key')]
+        return {'rows': rows, 'indexes': indexes}
+
+    # source: https://duckdb.org/docs/guides/meta/explain
+    def explain_duckdb_query(self, query):
+        # a columnar scan of the whole table is cheap, what costs is a huge result,
+        # so the estimate is the cardinality the plan expects the query to return
+        con = self.connect_duckdb()
+        try:
+            plan = json.loads(con.execute(f"EXPLAIN (FORMAT JSON) {query}").fetchone()[1])
+        finally:
+            con.close()
+
+        rows = None
+        node = plan[0] if plan else {'name': '', 'children': []}
+        while True:
+            estimate = node.get('extra_info', {}).get('Estimated Cardinality')
+            if estimate is not None:
+                rows = int(str(estimate).lstrip('~'))
+                break
+            if node['name'] == 'UNGROUPED_AGGREGATE':
+                # one row of aggregates over the whole table
+                rows = 1
+                break
+            if node['name'] in ('LIMIT', 'STREAMING_LIMIT', 'TOP_N') or len(node['children']) != 1:
+                # already limited, or a node whose output the plan doesn't estimate
+                break
+            node = node['children'][0]
+        return {'rows': rows, 'indexes': [], 'measure': 'returned'}
+
+    # source: https://www.mongodb.com/docs/manual/reference/command/explain/
+    def explain_mongo_query(self, query: Dict, collection_name):
+        db = self.connect_mongo()
+        collection = db[collection_name]
+        if query['type'] == 'find':
+            command = {'find': collection_name, 'filter': query.get('filter', {})}
+            if query.get('limit'):
+                command['limit'] = query['limit']
+        else:
+            command = {'aggregate': collection_name, 'pipeline': query['pipeline'], 'cursor': {}}
+        # executionStats runs the query, so it gets the same deadline
+        result = db.command('explain', command, verbosity=MONGO_EXPLAIN_VERBOSITY, maxTimeMS=QUERY_TIMEOUT_MS)
+
+        stages = self.collect_plan_nodes(result, 'stage')
+        indexes = [stage['indexName'] for stage in stages if stage['stage'] == 'IXSCAN' and 'indexName' in stage]
+        executions = self.collect_plan_nodes(result, 'totalDocsExamined')
+        if executions:
+            rows = max(int(execution['totalDocsExamined']) for execution in executions)
+        elif any(stage['stage'] == 'COLLSCAN' for stage in stages):
+            # a collection scan reads every document (unless an unfiltered find stops at its limit)
+            rows = collection.estimated_document_count()
+            if query['type'] == 'find' and not query.get('filter') and query.get('limit'):
+                rows = min(rows, query['limit'])
+        else:
+            # an index scan without execution stats has no row estimate
+            rows = None
+        return {'rows': rows, 'indexes': indexes}
+
+    def collect_plan_nodes(self, node, key):
+        # all dicts in a nested explain output that contain the given key
+        found = []
+        if isinstance(node, dict):
+            if key in node:
+                found.append(node)
+            for value in node.values():
+                found.extend(self.collect_plan_nodes(value, key))
+        elif isinstance(node, list):
+            for value in node:
+                found.extend(self.collect_plan_nodes(value, key))
+        return found
+
+    def guard_query(self, query, plan, db_type):
+        """
+        Returns (query to run, note). Over MAX_QUERY_ROWS (rows examined, or rows returned on
+        DuckDB) a plain row-returning query gets a LIMIT; grouping/aggregating queries would
+        still scan everything, so they are refused.
+        """
+        rows = plan['rows']
+        if rows is None or rows <= MAX_QUERY_ROWS:
+            return query, None
+        # the estimate is of rows examined, a query that already returns few rows runs as written
+        limit = self.query_limit(query, db_type)
+        if limit is not None and limit <= GUARD_LIMIT:
+            return query, None
+        reason = f"estimated {rows:,} rows {plan.get('measure', 'examined')} exceeds MAX_QUERY_ROWS ({MAX_QUERY_ROWS:,})"
+
+        if db_type in SQL_ENGINES:
+            sql = query['query']
+            if not re.search(r'\bGROUP BY\b|\b(SUM|AVG|COUNT|MIN|MAX)\s*\(|\bLIMIT\b', sql, re.IGNORECASE):
+                limited = dict(query, query=f"{sql.rstrip().rstrip(';')} LIMIT {GUARD_LIMIT}")
+                return limited, f"{reason}, limited to {GUARD_LIMIT} rows"
+        elif query['query']['type'] == 'find' and not query['query'].get('limit'):
+            limited = dict(query, query=dict(query['query'], limit=GUARD_LIMIT))
+            return limited, f"{reason}, limited to {GUARD_LIMIT} documents"
+
+        raise QueryRefusedError(reason)
+
+    def query_limit(self, query, db_type):
+        # the row limit the query sets itself, or None
+        if db_type in SQL_ENGINES:
+            # LIMIT n, LIMIT offset, n or LIMIT n OFFSET m at the end of the statement
+            match = re.search(r'\bLIMIT\s+(\d+)(?:\s*,\s*(\d+))?(?:\s+OFFSET\s+\d+)?\s*;?\s*$',
+                              query['query'], re.IGNORECASE)
+            return int(match.group(2) or match.group(1)) if match else None
+        if query['query']['type'] == 'find':
+            # 0 is no limit on a find
+            return query['query'].get('limit') or None
+        pipeline = query['query']['pipeline']
+        return pipeline[-1]['$limit'] if pipeline and '$limit' in pipeline[-1] else None
+
+    def describe_plan(self, summary):
+        plan = summary.get('plan')
+        if plan:
+            rows = 'unknown' if plan['rows'] is None else f"~{plan['rows']:,}"
+            access = f"index {', '.join(plan['indexes'])}" if plan['indexes'] else "full scan"
+            print(f"Plan: {rows} rows {plan.get('measure', 'examined')}, {access}")
+        if summary.get('note'):
+            print(f"Cost guard: {summary['note']}")
+
+    def record_index_usage(self, query, dataset_name, db_type):
+        # columnar scans don't use secondary indexes, nothing to advise on for duckdb
+        if db_type == 'duckdb':
+            return
+        # sql queries carry their column usage from generation, mongo usage is read off the query itself
+        usage = query.get('columns') if db_type == 'sql' else self.mongo_column_usage(query['query'])
+        if usage:
+            self.index_advisor.record(dataset_name, db_type, query, usage)
+
+    def mongo_column_usage(self, query: Dict):
+        usage = {'filter': [], 'group': [], 'sort': [], 'aggregate': []}
+        if query['type'] == 'find':
+            filters = [query.get('filter', {})]
+        else:
+            filters = []
+            for stage in query['pipeline']:
+                if '$match' in stage:
+                    filters.append(stage['$match'])
+                elif '$group' in stage:
+                    group_id = stage['$group'].get('_id')
+                    if isinstance(group_id, str) and group_id.startswith('$'):
+                        usage['group'].append(group_id[1:])
+                    for name, accumulator in stage['$group'].items():
+                        if isinstance(accumulator, dict):
+                            for arg in accumulator.values():
+                                if isinstance(arg, str) and arg.startswith('$'):
+                                    usage['aggregate'].append(arg[1:])
+        for filter_dict in filters:
+            for field, condition in filter_dict.items():
+                # a bare {$exists: true} matches nearly everything, an index doesn't help it
+                if field.startswith('$') or condition == {'$exists': True}:
+                    continue
+                usage['filter'].append(field)
+        return usage
+
+    def likely_indexes(self, df):
+        """
+        Guesses the indexes the generated queries will want before any have run:
+        low-cardinality text columns (grouping) and numeric columns (filtering/sorting).
+        """
+        group_cols = []
+        numeric_cols = []
+        for col in df.columns:
+            if pd.api.types.is_bool_dtype(df[col]):
+                continue
+            if pd.api.types.is_numeric_dtype(df[col]):
+                numeric_cols.append(col)
+            elif df[col].nunique() * 2 <= len(df):
+                group_cols.append(col)
+        # lowest cardinality groupings first
+        group_cols.sort(key=lambda col: df[col].nunique())
+
+        indexes = []
+        for group_col, numeric_col in itertools.zip_longest(group_cols, numeric_cols):
+            for col in (group_col, numeric_col):
+                if col is not None and len(indexes) < MAX_UPLOAD_INDEXES:
+                    indexes.append((col,))
+        return indexes
+
+    def show_index_suggestions(self, dataset_name, db_type):
+        if db_type == 'duckdb':
+            print("\nDuckDB scans tables column by column, no indexes to suggest")
+            return
+        suggestions = self.index_advisor.suggestions(dataset_name, db_type)
+        if not suggestions:
+            print("\nNo queries recorded for this dataset yet, run 'generate queries' first")
+            return
+        print(f"\nSuggested indexes for {dataset_name}:")
+        for columns, uses in suggestions:
+            print(f"  ({', '.join(columns)}) - used by {uses} query run(s)")
+
+    def build_indexes(self, dataset_name, db_type, indexes=None, measure=True):
+        """
+        Creates the given indexes (default: the advisor's suggestions) and, when measure is set,
+        times the dataset's recent queries before and after to report the latency saved.
+        """
+        if db_type == 'duckdb':
+            print("\nDuckDB scans tables column by column, no indexes to build")
+            return
+        if indexes is None:
+            indexes = [columns for columns, _ in self.index_advisor.suggestions(dataset_name, db_type)]
+        if not indexes:
+            print("\nNo indexes to build")
+            return
+
+        queries = self.index_advisor.recent_queries(dataset_name, db_type) if measure else []
+        before = self.time_queries(queries, dataset_name, db_type)
+
+        if db_type == 'sql':
+            created = self.create_sql_indexes(dataset_name, indexes)
+        else:
+            created = self.create_mongo_indexes(dataset_name, indexes)
+        print(f"\nCreated {created} index(es) on {dataset_name}")
+
+        if queries:
+            after = self.time_queries(queries, dataset_name, db_type)
+            print("\nLatency before -> after:")
+            for query, old, new in zip(queries, before, after):
+                label = query.get('description', query.get('title', 'Query'))
+                print(f"  {label}: {old * 1000:.1f} ms -> {new * 1000:.1f} ms")
+            print(f"Total saved: {(sum(before) - sum(after)) * 1000:.1f} ms per run of the workload")
+
+    def time_queries(self, queries, dataset_name, db_type):
+        # runs straight against the database, skipping the result cache
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            self.fetch_uncached(query['query'], dataset_name, db_type)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def fetch_uncached(self, query, dataset_name, db_type, timeout_ms=QUERY_TIMEOUT_MS):
+        # one query on the backend: no result cache, no cost guard, nothing printed
+        if db_type == 'sql':
+            return self.fetch_sql_summary(query, timeout_ms=timeout_ms)
+        if db_type == 'duckdb':
+            return self.fetch_duckdb_summary(query, timeout_ms=timeout_ms)
+        return self.fetch_mongo_summary(query, dataset_name, timeout_ms=timeout_ms)
+
+    def index_name(self, columns):
+        # mysql index names are limited to 64 characters
+        name = 'idx_' + '_'.join(re.sub(r'\W+', '_', col) for col in columns)
+        return name.rstrip('_')[:64]
+
+    # source: https://dev.mysql.com/doc/refman/8.0/en/create-index.html
+    def create_sql_indexes(self, table_name, indexes):
+        column_types = dict(self.get_schema(table_name, 'sql')['columns'])
+        cnx = self.connect_mysql()
+        try:
+            cursor = cnx.cursor()
+            # skip indexes whose columns are already indexed in the same order
+            cursor.execute(f"SHOW INDEX FROM {table_name}")
+            existing = {}
+            for row in cursor.fetchall():
+                existing.setdefault(row[2], []).append(row[4])
+            existing = {tuple(cols) for cols in existing.values()}
+
+            created = 0
+            for columns in indexes:
+                if columns in existing or any(col not in column_types for col in columns):
+                    continue
+                parts = ', '.join(self.index_column(col, column_types[col]) for col in columns)
+                try:
+                    cursor.execute(f"CREATE INDEX `{self.index_name(columns)}` ON {table_name} ({parts})")
+                except mysql.connector.Error as e:
+                    # one index the server won't build shouldn't stop the others
+                    print(f"Could not create index on ({', '.join(columns)}): {e}")
+                    continue
+                existing.add(columns)
+                created += 1
+        finally:
+            cnx.close()
+        return created
+
+    def index_column(self, col, sql_type):
+        # TEXT/BLOB columns can only be indexed on a prefix, and a long VARCHAR
+        # can go over the key size limit, so both are indexed on their first characters
+        if isinstance(sql_type, (bytes, bytearray)):
+            sql_type = sql_type.decode()
+        base = self.base_sql_type(sql_type)
+        length = re.search(r'\((\d+)\)', sql_type)
+        if base in ('text', 'tinytext', 'mediumtext', 'longtext', 'blob') or (
+                base in ('varchar', 'char') and length and int(length.group(1)) > TEXT_INDEX_PREFIX):
+            return f"`{col}`({TEXT_INDEX_PREFIX})"
+        return f"`{col}`"
+
+    # source: https://pymongo.readthedocs.io/en/stable/api/pymongo/collection.html#pymongo.collection.Collection.create_index
+    def create_mongo_indexes(self, collection_name, indexes):
+        collection = self.connect_mongo()[collection_name]
+        existing = {tuple(field for field, _ in info['key']) for info in collection.index_information().values()}
+        created = 0
+        for columns in indexes:
+            if columns in existing:
+                continue
+            try:
+                collection.create_index([(field, 1) for field in columns])
+            except pymongo.errors.PyMongoError as e:
+                print(f"Could not create index on ({', '.join(columns)}): {e}")
+                continue
+            existing.add(columns)
+            created += 1
+        return created
+
+    def show_trace_stats(self):
+        if STARTUP_TIMES:
+            print("\nStartup (ms):")
+            for step, seconds in STARTUP_TIMES.items():
+                print(f"{step:<32} {seconds * 1000:>9.1f}")
+        stats = self.tracer.get_stats()
+        if not stats:
+            print("\nNo timings recorded yet")
+            return
+        print("\nTiming Stats (ms):")
+        print(f"{'step':<24} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'total':>10}")
+        # slowest steps overall first
+        for name, span in sorted(stats.items(), key=lambda item: -item[1]['total_ms']):
+            print(f"{name:<24} {span['count']:>7} {span['p50_ms']:>9.2f} {span['p95_ms']:>9.2f} "
+                  f"{span['p99_ms']:>9.2f} {span['max_ms']:>9.2f} {span['total_ms']:>10.1f}")
+
+    def export_traces(self, path=TRACE_EXPORT_PATH):
+        try:
+            count = self.tracer.export(path)
+            print(f"\nExported {count} span(s) to {path}")
+        except OSError as e:
+            print(f"Error exporting traces: {e}")
+
+    def generate_workload(self, dataset_name, db_type, count=WORKLOAD_SIZE, seed=WORKLOAD_SEED, mix=None, path=None):
+        """
+        Generates `count` bound queries for a dataset with a WorkloadGenerator. With a path the
+        queries are streamed to a JSON lines file (one query per line, ready for replay) and the
+        number written is returned, otherwise the list of queries is returned.
+        """
+        generator = WorkloadGenerator(self, dataset_name, db_type, seed, mix)
+        queries = generator.generate(count)
+        if path is None:
+            return list(queries)
+        written = 0
+        with open(path, 'w') as f:
+            for query in queries:
+                f.write(json.dumps(dict(query, id=written, dataset=dataset_name, db_type=db_type), default=str) + '\n')
+                written += 1
+        return written
+
+    def parse_workload_mix(self, text):
+        # "group_by=3, where=1" -> {'group_by': 3.0, 'where': 1.0}, blank means the default mix
+        mix = {}
+        for item in text.split(','):
+            if item.strip():
+                query_type, _, weight = item.partition('=')
+                mix[query_type.strip()] = float(weight) if weight.strip() else 1.0
+        return mix or None
+
+    def load_workload(self, path):
+        """
+        Reads a workload file, one query per line: the JSON lines written by 'generate workload',
+        a bare Mongo query dict ({"type": "find"|"aggregate", ...}), a JSON string or plain SQL text.
+        Returns [{'type': label, 'query': ..., 'dataset': ..., 'db_type': ...}] (dataset/db_type may be None).
+        """
+        entries = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # not JSON, so a SQL statement
+                    item = line
+                if isinstance(item, dict) and 'query' in item:
+                    query = item['query']
+                    db_type = item.get('db_type') or ('sql' if isinstance(query, str) else 'mongo')
+                    label = item.get('type') or (query['type'] if isinstance(query, dict) else 'sql')
+                    entries.append({'type': label, 'query': query, 'dataset': item.get('dataset'), 'db_type': db_type})
+                elif isinstance(item, dict):
+                    entries.append({'type': item.get('type', 'mongo'), 'query': item, 'dataset': None, 'db_type': 'mongo'})
+                else:
+                    entries.append({'type': 'sql', 'query': str(item).rstrip(';'), 'dataset': None, 'db_type': 'sql'})
+        return entries
+
+    def replay_query(self, entry, dataset_name, db_type, scheduled, timeout_ms):
+        # on a schedule, latency runs from the time the query was due, so a backed-up server
+        # can't hide its queueing; without one (scheduled None) it runs from now
+        if scheduled is None:
+            scheduled = time.perf_counter()
+        try:
+            self.fetch_uncached(entry['query'], dataset_name, db_type, timeout_ms)
+            outcome = 'ok'
+        except QueryTimeoutError:
+            outcome = 'timeout'
+        except Exception as e:
+            outcome = f"error: {e}"
+        return entry['type'], time.perf_counter() - scheduled, outcome
+
+    def replay_workload(self, entries, dataset_name=None, db_type=None, concurrency=REPLAY_CONCURRENCY,
+                        rate=None, count=None, duration=None, timeout_ms=QUERY_TIMEOUT_MS):
+        """
+        Runs workload entries against the backend with `concurrency` queries in flight. With a
+        rate (queries/s) queries are sent on an open-loop schedule, otherwise as fast as the
+        workers take them. The workload repeats until `count` queries or `duration` seconds.
+        Returns (outcomes as (type, latency seconds, outcome), elapsed seconds).
+        """
+        if not entries:
+            return [], 0
+        count = count or (None if duration else len(entries))
+        # without a schedule, one slot per worker: a query is only sent when a worker is free
+        slots = threading.BoundedSemaphore(concurrency)
+        outcomes = []
+
+        def collect(future):
+            # results are kept as they finish, the futures themselves are not
+            if not rate:
+                slots.release()
+            if not future.cancelled():
+                outcomes.append(future.result())
+
+        start = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay')
+        try:
+            for i, entry in enumerate(itertools.cycle(entries)):
+                if count is not None and i >= count:
+                    break
+                if duration is not None and time.perf_counter() - start >= duration:
+                    break
+                if rate:
+                    scheduled = start + i / rate
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                else:
+                    slots.acquire()
+                    # timed from when the worker starts it
+                    scheduled = None
+                future = pool.submit(self.replay_query, entry, dataset_name or entry['dataset'],
+                                     db_type or entry['db_type'], scheduled, timeout_ms)
+                future.add_done_callback(collect)
+            pool.shutdown(wait=True)
+        except KeyboardInterrupt:
+            # stop sending, drop what's queued and kill what's running
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.cancel_active_queries()
+            print("\nReplay cancelled, reporting the queries that finished")
+        elapsed = time.perf_counter() - start
+        return list(outcomes), elapsed
+
+    def replay_report(self, outcomes, elapsed):
+        """Per query type (and overall): count, throughput, p50/p95/p99 latency and error rates."""
+        groups = {}
+        for query_type, latency, outcome in outcomes:
+            groups.setdefault(query_type, []).append((latency, outcome))
+        groups['all'] = [(latency, outcome) for _, latency, outcome in outcomes]
+
+        report = {}
+        for query_type, results in groups.items():
+            latencies = sorted(latency for latency, _ in results)
+            errors = sum(1 for _, outcome in results if outcome.startswith('error'))
+            timeouts = sum(1 for _, outcome in results if outcome == 'timeout')
+            first_error = next((outcome for _, outcome in results if outcome.startswith('error')), None)
+            report[query_type] = {
+                'count': len(results),
+                'throughput_qps': len(results) / elapsed if elapsed else 0,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'max_ms': latencies[-1] * 1000,
+                'error_rate': errors / len(results),
+                'timeout_rate': timeouts / len(results),
+                'first_error': first_error
+            }
+        return report
+
+    def show_replay_report(self, report, elapsed):
+        overall = report.get('all')
+        if not overall:
+            print("\nNo queries completed")
+            return
+        print(f"\nReplayed {overall['count']} queries in {elapsed:.2f}s ({overall['throughput_qps']:.1f} queries/s)")
+        print(f"{'type':<16} {'count':>7} {'qps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'timeouts':>9}")
+        for query_type, row in report.items():
+            print(f"{query_type:<16} {row['count']:>7} {row['throughput_qps']:>8.1f} {row['p50_ms']:>9.2f} "
+                  f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['error_rate']:>7.1%} {row['timeout_rate']:>9.1%}")
+        for query_type, row in report.items():
+            if row['first_error'] and query_type != 'all':
+                print(f"First {query_type} {row['first_error']}")
+
+    def show_cache_stats(self):
+        print("\nQuery Result Cache Stats:")
+        for key, value in self.result_cache.get_stats().items():
+            print(f"{key}: {value}")
+
+    @traced
+    def render_query_summary(self, summary, db_type):
+        self.describe_plan(summary)
+        if db_type in SQL_ENGINES:
+            self.render_sql_summary(summary)
+        else:
+            self.render_mongo_summary(summary)
+
+    @traced
+    def print_generated_query(self, number, query, dataset_name, db_type):
+        print(f"\n{number}. {query.get('description', query.get('title', 'Query'))}:")
+        if db_type in SQL_ENGINES:
+            print(query['query'])
+        else:
+            # Print MongoDB command and parameters
+            if 'mongo_command' in query:
+                mongo_command = query['mongo_command'].replace('collection_name', dataset_name)
+                print(f"MongoDB Command:")
+                print(mongo_command)
+            print(f"\nQuery type: {query['query']['type']}")
+        print("\nExecuting query...")
+
+    def run_generated_queries(self, queries, dataset_name, db_type, concurrent=CONCURRENT_QUERIES):
+        """
+        Prints and executes a batch of generated queries. In concurrent mode the queries run on
+        a thread pool capped by MAX_CONCURRENT_QUERIES, and results are still printed in order.
+        """
+        if not concurrent:
+            for i, query in enumerate(queries, 1):
+                self.print_generated_query(i, query, dataset_name, db_type)
+                self.execute_query(query, dataset_name, db_type)
+            return
+
+        workers = max(1, min(len(queries), MAX_CONCURRENT_QUERIES.get(db_type, 1)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # identical queries in the batch share one execution
+            by_key = {}
+            futures = []
+            for query in queries:
+                key = self.result_cache_key(query, dataset_name, db_type)
+                if key not in by_key:
+                    by_key[key] = pool.submit(self.fetch_query_summary, query, dataset_name, db_type)
+                futures.append(by_key[key])
+
+            # walk the futures in submission order so the output order matches the batch
+            failures = Counter()
+            try:
+                for i, (query, future) in enumerate(zip(queries, futures), 1):
+                    self.print_generated_query(i, query, dataset_name, db_type)
+                    try:
+                        summary = future.result()
+                    except Exception as e:
+                        self.print_query_error(e)
+                        failures[type(e)] += 1
+                        continue
+                    self.render_query_summary(summary, db_type)
+            except KeyboardInterrupt:
+                # drop the queries that haven't started and kill the running ones on the server
+                pool.shutdown(wait=False, cancel_futures=True)
+                self.cancel_active_queries()
+                print("\nQueries cancelled")
+                return
+
+        if failures:
+            timeouts = failures.pop(QueryTimeoutError, 0)
+            refused = failures.pop(QueryRefusedError, 0)
+            print(f"\n{timeouts} timed out, {refused} refused, {sum(failures.values())} failed")
 
     def execute_sql_query(self, query):
+        # Stream the result and keep only what gets printed
+        summary = self.fetch_sql_summary(query)
+        self.render_sql_summary(summary)
+
+    # source: https://dev.mysql.com/doc/connector-python/en/connector-python-api-mysqlcursor.html
+    @traced
+    def fetch_sql_summary(self, query, head_rows=RESULT_HEAD_ROWS, timeout_ms=QUERY_TIMEOUT_MS):
+        """
+        Runs a query on an unbuffered cursor and reads the rows one at a time, keeping
+        only the first head_rows rows and the last row. Memory stays the same no matter
+        how many rows the query returns. Raises QueryTimeoutError past timeout_ms.
+        """
+        # the optimizer hint makes the server stop the SELECT at the deadline
+        if timeout_ms:
+            query = re.sub(r'^\s*SELECT\b', f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */", query,
+                           count=1, flags=re.IGNORECASE)
+
         # Establish a connection to the MySQL database
         cnx = self.connect_mysql()
-        # Create a cursor object for executing SQL commands
-        cursor = cnx.cursor()
-        # Execute the provided SQL query
-        cursor.execute(query)
-        # Fetch all results from the executed query
-        results = cursor.fetchall()
-
-        if results:
+        token = self.register_query('sql', connection_id=cnx.connection_id)
+        completed = False
+        try:
+            # unbuffered cursor: rows are read off the socket as we iterate instead of all at once
+            cursor = cnx.cursor(buffered=False)
+            # Execute the provided SQL query
+            cursor.execute(query)
             # Extract column names from the cursor's description attribute (contains metadata about the results)
-            headers = [desc[0] for desc in cursor.description]
+            headers = [desc[0] for desc in cursor.description] if cursor.description else []
+
+            head = []
+            last = None
+            total = 0
+            for row in cursor:
+                if total < head_rows:
+                    head.append(row)
+                else:
+                    # rolling last row, everything in between is only counted
+                    last = row
+                total += 1
+            completed = True
+        except KeyboardInterrupt:
+            # kill it on the server while the token still says where it runs
+            self.cancel_query(token)
+            raise
+        except mysql.connector.Error as e:
+            if e.errno == MYSQL_QUERY_TIMEOUT_ERRNO:
+                raise QueryTimeoutError(f"stopped by the server after {timeout_ms / 1000:g}s") from e
+            raise
+        finally:
+            self.active_queries.pop(token, None)
+            # hand the connection back to the pool even if the query fails
+            self.connections.release_mysql(cnx, discard=not completed)
+
+        return {'headers': headers, 'head': head, 'last': last, 'total': total}
+
+    # source: https://duckdb.org/docs/api/python/dbapi
+    @traced
+    def fetch_duckdb_summary(self, query, head_rows=RESULT_HEAD_ROWS, timeout_ms=QUERY_TIMEOUT_MS):
+        """
+        Runs a query on the embedded database and reads the result in chunks, keeping the
+        first head_rows rows and the last row like fetch_sql_summary. There is no server to
+        enforce a deadline, so a timer interrupts the query after timeout_ms.
+        """
+        con = self.connect_duckdb()
+        token = self.register_query('duckdb', connection=con)
+        timer = None
+        # set before the interrupt, so the InterruptException can tell a timeout from a cancel
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            con.interrupt()
+
+        if timeout_ms:
+            timer = threading.Timer(timeout_ms / 1000, expire)
+            timer.start()
+        try:
+            con.execute(query)
+            headers = [desc[0] for desc in con.description] if con.description else []
+
+            head = []
+            last = None
+            total = 0
+            while True:
+                rows = con.fetchmany(DUCKDB_FETCH_SIZE)
+                if not rows:
+                    break
+                if total < head_rows:
+                    head.extend(rows[:head_rows - total])
+                if total + len(rows) > head_rows:
+                    last = rows[-1]
+                total += len(rows)
+        except KeyboardInterrupt:
+            self.cancel_query(token)
+            raise
+        except duckdb.InterruptException as e:
+            # the timer fired (a Ctrl-C cancel interrupts too, and is not a timeout)
+            if timed_out.is_set():
+                raise QueryTimeoutError(f"interrupted after {timeout_ms / 1000:g}s") from e
+            raise
+        except RuntimeError as e:
+            # duckdb handles Ctrl-C itself, it interrupts the query and raises this instead
+            if str(e) == 'Query interrupted' and threading.current_thread() is threading.main_thread():
+                raise KeyboardInterrupt from e
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self.active_queries.pop(token, None)
+            con.close()
+
+        return {'headers': headers, 'head': head, 'last': last, 'total': total}
+
+    def render_sql_summary(self, summary):
+        if summary['total']:
+            # SELECT * also returns the row hash, which is upload bookkeeping
+            keep = [i for i, header in enumerate(summary['headers']) if header != ROW_HASH_COLUMN]
+            if len(keep) < len(summary['headers']):
+                summary = dict(
+                    summary,
+                    headers=[summary['headers'][i] for i in keep],
+                    head=[tuple(row[i] for i in keep) for row in summary['head']],
+                    last=tuple(summary['last'][i] for i in keep) if summary['last'] else summary['last']
+                )
+            headers = summary['headers']
             print("\nResults:")
             # Print the headers in a row, separated by pipes
             print(" | ".join(headers))
             # Print a divider line matching the header length
             print("-" * len(" | ".join(headers)))
 
-            # Iterate through the results and print up to 8 rows
-            for i, row in enumerate(results):
-                if i < 8:
-                    # Convert each value in the row to a string and join them with pipes for display
-                    print(" | ".join(str(val) for val in row))
-                elif i == 8:
-                    # Print an ellipsis after the 8th row to indicate truncation
-                    print("...")
-                elif i == len(results) - 1:
-                    # Print the last row if results exceed the display limit
-                    print(" | ".join(str(val) for val in row))
-            
+            # Convert each value in the row to a string and join them with pipes for display
+            for row in summary['head']:
+                print(" | ".join(str(val) for val in row))
+            if summary['total'] > len(summary['head']):
+                # Print an ellipsis after the leading rows to indicate truncation
+                print("...")
+            if summary['total'] > len(summary['head']) + 1:
+                # Print the last row if results exceed the display limit
+                print(" | ".join(str(val) for val in summary['last']))
+
             # Display the total number of rows in the result set
-            print(f"\nTotal rows: {len(results)}")
+            print(f"\nTotal rows: {summary['total']}")
         else:
             # Handle the case where no rows are returned by the query
             print("No results found.")
-        
-        cnx.close()
 
     def execute_mongo_query(self, query: Dict, collection_name):
+        # Read the cursor lazily and count on the server
+        summary = self.fetch_mongo_summary(query, collection_name)
+        self.render_mongo_summary(summary)
+
+    # source: https://www.mongodb.com/docs/manual/reference/operator/aggregation/facet/
+    @traced
+    def fetch_mongo_summary(self, query: Dict, collection_name, head_rows=RESULT_HEAD_ROWS, timeout_ms=QUERY_TIMEOUT_MS):
+        """
+        Runs a find/aggregate query keeping only the first head_rows documents and the last one.
+        The total comes from the server (count_documents or a $facet/$group stage), so the
+        documents in between are never sent over the wire. Raises QueryTimeoutError past timeout_ms.
+        """
         db = self.connect_mongo()
         collection = db[collection_name]
+        # every operation carries the deadline and a comment that identifies it for killOp
+        token = self.register_query('mongo')
+        options = {'comment': token}
+        if timeout_ms:
+            options['maxTimeMS'] = int(timeout_ms)
+        try:
+            return self.read_mongo_summary(collection, query, head_rows, options)
+        except KeyboardInterrupt:
+            # killOp finds the operation by the comment, so cancel before forgetting the token
+            self.cancel_query(token)
+            raise
+        except pymongo.errors.ExecutionTimeout as e:
+            raise QueryTimeoutError(f"stopped by the server after {timeout_ms / 1000:g}s") from e
+        finally:
+            self.active_queries.pop(token, None)
+
+    def read_mongo_summary(self, collection, query: Dict, head_rows, options):
+        """Does the reads for fetch_mongo_summary, options go on every server call."""
 
         if query['type'] == 'find':
             # Extract the filter criteria from the query dictionary (default to an empty filter if not provided)
             filter_dict = query.get('filter', {})
             # Extract the projection (field selection) from the query dictionary if available
             projection = query.get('projection', None)
-            # Perform a find operation with the filter and projection and convert results to a list
-            results = list(collection.find(filter_dict, projection))
+            limit = query.get('limit', 0)
+
+            # lazy cursor, the first batch is exactly the documents we display
+            cursor = collection.find(filter_dict, projection, limit=limit, comment=options['comment'],
+                                     max_time_ms=options.get('maxTimeMS')).batch_size(head_rows)
+            head = list(itertools.islice(cursor, head_rows))
+            cursor.close()
+
+            total = len(head)
+            last = None
+            if len(head) == head_rows:
+                # more documents may follow, so count them on the server
+                if not filter_dict and not limit:
+                    # an unfiltered count can come straight from the collection metadata
+                    total = collection.estimated_document_count(**options)
+                elif limit:
+                    total = collection.count_documents(filter_dict, limit=limit, **options)
+                else:
+                    total = collection.count_documents(filter_dict, **options)
+                if total > head_rows + 1:
+                    # jump straight to the last document instead of reading up to it
+                    last_cursor = collection.find(filter_dict, projection, comment=options['comment'],
+                                                  max_time_ms=options.get('maxTimeMS'))
+                    last = next(last_cursor.skip(total - 1).limit(1), None)
         elif query['type'] == 'aggregate':
-            # Execute the aggregation pipeline defined in the query and convert results to a list
-            results = list(collection.aggregate(query['pipeline']))
+            # one extra stage returns the leading documents, the count and the last document together
+            pipeline = list(query['pipeline']) + [{'$facet': {
+                'head': [{'$limit': head_rows}],
+                'summary': [{'$group': {'_id': None, 'total': {'$sum': 1}, 'last': {'$last': '$$ROOT'}}}]
+            }}]
+            result = next(collection.aggregate(pipeline, allowDiskUse=True, **options), {'head': [], 'summary': []})
+            head = result['head']
+            total = result['summary'][0]['total'] if result['summary'] else 0
+            last = result['summary'][0]['last'] if result['summary'] else None
+
+        return {'head': head, 'last': last, 'total': total}
 
-        if results:
+    def render_mongo_summary(self, summary):
+        if summary['total']:
             print("\nResults:")
-            # Iterate through the results and print up to 8 documents
-            for i, doc in enumerate(results):
-                if i < 8:
-                    # Remove the `_id` field from each document to simplify display
-                    if '_id' in doc:
-                        del doc['_id']
-                    print(doc)
-                elif i == 8:
-                    # Print an ellipsis after the 8th document to indicate truncation
-                    print("...")
-                elif i == len(results) - 1:
-                    # Print the last document if results exceed the display limit
-                    if '_id' in doc:
-                        del doc['_id']
-                    print(doc)
-            
+            # Remove the `_id` field from each document to simplify display
+            for doc in summary['head']:
+                print({key: val for key, val in doc.items() if key not in ('_id', ROW_HASH_COLUMN)})
+            if summary['total'] > len(summary['head']):
+                # Print an ellipsis after the leading documents to indicate truncation
+                print("...")
+            if summary['total'] > len(summary['head']) + 1 and summary['last'] is not None:
+                # Print the last document if results exceed the display limit
+                print({key: val for key, val in summary['last'].items() if key not in ('_id', ROW_HASH_COLUMN)})
+
             # Display the total number of documents in the result set
-            print(f"\nTotal documents: {len(results)}")
+            print(f"\nTotal documents: {summary['total']}")
         else:
             # Handle the case where no documents match the query
             print("No results found.")
@@ -833,7 +3721,11 @@ class ChatDB:
 
 def main():
     chatdb = ChatDB()
-    chatdb.display_available_databases()
+    # no backend is contacted before the first prompt, datasets are listed per backend on request
+    print("\nWelcome to ChatDB!")
+    print("Type 'switch database' to pick a database and dataset, 'upload dataset' to add one, "
+          "or 'commands' to see everything else.")
+    STARTUP_TIMES['first prompt'] = time.perf_counter() - MODULE_LOAD_START
     
     while True:
         try:
@@ -841,26 +3733,101 @@ def main():
             
             if command == 'commands':
                 chatdb.get_commands()
+
+            elif command == 'refresh datasets':
+                # only the current backend, or all of them before one is picked
+                db_types = [chatdb.current_db_type] if chatdb.current_db_type else None
+                chatdb.display_available_databases(refresh=True, db_types=db_types)
+
+            elif command == 'pool stats':
+                chatdb.show_pool_stats()
+
+            elif command == 'cache stats':
+                chatdb.show_cache_stats()
+
+            elif command == 'stats':
+                chatdb.show_trace_stats()
+
+            elif command == 'export traces':
+                path = input(f"Export file (default {TRACE_EXPORT_PATH}): ").strip()
+                chatdb.export_traces(path or TRACE_EXPORT_PATH)
+
+            elif command == 'suggest indexes':
+                if chatdb.current_dataset:
+                    chatdb.show_index_suggestions(chatdb.current_dataset, chatdb.current_db_type)
+                else:
+                    print("Please select a dataset first")
+
+            elif command == 'build indexes':
+                if chatdb.current_dataset:
+                    chatdb.build_indexes(chatdb.current_dataset, chatdb.current_db_type)
+                else:
+                    print("Please select a dataset first")
             
+            elif command == 'generate workload':
+                if not chatdb.current_dataset:
+                    print("Please select a dataset first")
+                    continue
+                count = input(f"Number of queries (default {WORKLOAD_SIZE}): ").strip()
+                seed = input(f"Seed (default {WORKLOAD_SEED}): ").strip()
+                mix = input("Query type weights, e.g. group_by=3,where=1 (blank for an even mix): ").strip()
+                default_path = f"{chatdb.current_dataset}_workload.jsonl"
+                path = input(f"Output file (default {default_path}): ").strip() or default_path
+                try:
+                    start = time.perf_counter()
+                    written = chatdb.generate_workload(
+                        chatdb.current_dataset, chatdb.current_db_type,
+                        int(count) if count.isdigit() else WORKLOAD_SIZE,
+                        int(seed) if seed.isdigit() else WORKLOAD_SEED,
+                        chatdb.parse_workload_mix(mix), path
+                    )
+                    print(f"\nWrote {written} queries to {path} in {time.perf_counter() - start:.2f}s")
+                except ValueError as e:
+                    print(f"Error generating workload: {e}")
+
             elif command == 'switch database':
+                db_types = chatdb.available_db_types()
+                db_type = input(f"Enter database type ({'/'.join(db_types)}): ").strip().lower()
+                if db_type not in db_types:
+                    print("Invalid database type")
+                    continue
                 chatdb.current_db_type = None
                 chatdb.current_dataset = None
-                chatdb.display_available_databases()
+                # only the chosen backend is connected to
+                chatdb.display_available_databases(db_types=[db_type])
                 
                 # Get dataset name
                 dataset = input("\nEnter dataset name: ").strip()
                 
                 # Try to set the dataset
-                if not chatdb.set_current_dataset(dataset):
+                if not chatdb.set_current_dataset(dataset, db_type):
                     print(f"Dataset '{dataset}' not found")
                 
             elif command == 'upload dataset':
-                db_type = input("Enter database type (sql/mongo): ").strip().lower()
-                if db_type in ['sql', 'mongo']:
+                db_types = chatdb.available_db_types()
+                db_type = input(f"Enter database type ({'/'.join(db_types)}): ").strip().lower()
+                if db_type in db_types:
                     file_path = input("Enter CSV file path: ").strip()
                     dataset = input(f"Enter new {db_type} dataset name: ").strip()
+                    # large files can be streamed in chunks instead of loaded all at once
+                    stream = input("Stream the file in chunks? (y/n): ").strip().lower() == 'y'
+                    budget = STREAM_MEMORY_BUDGET_MB
+                    if stream:
+                        budget_input = input(f"Memory budget in MB (default {STREAM_MEMORY_BUDGET_MB}): ").strip()
+                        if budget_input.isdigit():
+                            budget = int(budget_input)
+                    auto_index = input("Build likely indexes after the upload? (y/n): ").strip().lower() == 'y'
+                    # replace reloads everything, append/upsert only write new (and changed) rows
+                    mode = input(f"Upload mode ({'/'.join(UPLOAD_MODES)}, default replace): ").strip().lower() or 'replace'
+                    key = None
+                    if mode not in UPLOAD_MODES:
+                        print("Invalid upload mode")
+                        continue
+                    if mode != 'replace':
+                        key_input = input("Key column(s), comma separated (blank to match rows by content): ").strip()
+                        key = [col.strip() for col in key_input.split(',') if col.strip()] or None
                     chatdb.current_db_type = db_type
-                    chatdb.upload_csv(file_path, dataset, db_type)
+                    chatdb.upload_csv(file_path, dataset, db_type, stream, budget, auto_index, mode, key)
                 else:
                     print("Invalid database type")
                 
@@ -876,7 +3843,7 @@ def main():
                     continue
                 
                 while True:  # Create submenu loop
-                    if chatdb.current_db_type == 'sql':
+                    if chatdb.current_db_type in SQL_ENGINES:
                         print("\nAvailable SQL query types:")
                         print("example sql queries")
                         print("example query with group by")
@@ -905,29 +3872,20 @@ def main():
                         break
                     
                     db_type, query_type = chatdb.process_command(query_command)
+                    # the sql query types also run on duckdb
+                    if db_type == 'sql' and chatdb.current_db_type in SQL_ENGINES:
+                        db_type = chatdb.current_db_type
                     
                     if db_type and db_type == chatdb.current_db_type:
                         queries = chatdb.generate_query(chatdb.current_dataset, db_type, query_type)
                         print("\nGenerated Queries:")
-                        for i, query in enumerate(queries, 1):
-                            print(f"\n{i}. {query.get('description', query.get('title', 'Query'))}:")
-                            if db_type == 'sql':
-                                print(query['query'])
-                            else:
-                                # Print MongoDB command and parameters
-                                if 'mongo_command' in query:
-                                    mongo_command = query['mongo_command'].replace('collection_name', chatdb.current_dataset)
-                                    print(f"MongoDB Command:")
-                                    print(mongo_command)
-                                print(f"\nQuery type: {query['query']['type']}")
-                                # print(f"Parameters: {query['query']}")
-                            print("\nExecuting query...")
-                            chatdb.execute_query(query, chatdb.current_dataset, db_type)
+                        chatdb.run_generated_queries(queries, chatdb.current_dataset, db_type)
                         print("\nType 'commands' to see the list of available commands")
                     else:
                         print("Invalid query type")
                     
             elif command == 'exit':
+                chatdb.close()
                 print("Thank you for using ChatDB!")
                 break
                 
@@ -938,14 +3896,69 @@ def main():
                 
                 # Check if it's a query command
                 db_type, query_type = chatdb.process_command(command)
+                if db_type == 'sql' and chatdb.current_db_type in SQL_ENGINES:
+                    db_type = chatdb.current_db_type
                 if db_type:
                     if db_type != chatdb.current_db_type:
                         print(f"Current database type is {chatdb.current_db_type}, but command is for {db_type}")
+                elif not chatdb.current_dataset and not chatdb.used_db_types:
+                    # no backend listed yet, so a dataset name couldn't be looked up
+                    print("Invalid command. Type 'switch database' to pick a dataset, or 'commands' to see available commands.")
                 else:
                     print("Invalid command. Type 'commands' to see available commands.")
                 
+        except KeyboardInterrupt:
+            # Ctrl-C returns to the prompt instead of ending the session
+            chatdb.cancel_active_queries()
+            print("\nCancelled. Type 'exit' to quit.")
         except Exception as e:
             print(f"An error occurred: {e}")
 
+# everything above ran at import, the backends' imports come later and are timed separately
+STARTUP_TIMES['import chatdb'] = time.perf_counter() - MODULE_LOAD_START
+
+def replay_main(argv):
+    # non-interactive load test: python chatdb.py replay workload.jsonl --concurrency 8 --rate 200
+    parser = argparse.ArgumentParser(prog='chatdb.py replay',
+                                     description="Replay a query workload and report latency percentiles")
+    parser.add_argument('workload', help="JSON lines from 'generate workload', Mongo query dicts or SQL lines")
+    parser.add_argument('--dataset', help="table/collection to run against (default: the one in the workload)")
+    parser.add_argument('--db-type', choices=['sql', 'mongo', 'duckdb'], help="backend (default: the one in the workload)")
+    parser.add_argument('--concurrency', type=int, default=REPLAY_CONCURRENCY, help="queries in flight at once")
+    parser.add_argument('--rate', type=float, help="target queries per second (default: as fast as possible)")
+    parser.add_argument('--count', type=int, help="queries to send, the workload repeats (default: one pass)")
+    parser.add_argument('--duration', type=float, help="stop sending after this many seconds")
+    parser.add_argument('--timeout-ms', type=int, default=QUERY_TIMEOUT_MS, help="per-query deadline")
+    parser.add_argument('--output', help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    chatdb = ChatDB()
+    entries = chatdb.load_workload(args.workload)
+    if any(entry['db_type'] == 'mongo' and not (args.dataset or entry['dataset']) for entry in entries):
+        parser.error("--dataset is needed for Mongo queries without a dataset")
+    if args.count:
+        amount = f"{args.count} queries"
+    elif args.duration:
+        amount = f"{args.duration:g}s"
+    else:
+        amount = "one pass"
+    print(f"Replaying {amount} of the {len(entries)} queries in {args.workload} "
+          f"at concurrency {args.concurrency}" + (f", {args.rate:g} queries/s" if args.rate else ""))
+
+    outcomes, elapsed = chatdb.replay_workload(entries, args.dataset, args.db_type, args.concurrency,
+                                               args.rate, args.count, args.duration, args.timeout_ms)
+    report = chatdb.replay_report(outcomes, elapsed)
+    chatdb.show_replay_report(report, elapsed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'workload': args.workload, 'concurrency': args.concurrency, 'rate': args.rate,
+                       'elapsed_s': elapsed, 'types': report}, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    chatdb.close()
+
+
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ['replay']:
+        replay_main(sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# the tests import chatdb from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chatdb
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fixture_path(name):
+    return os.path.join(REPO, name)
+
+
+@pytest.fixture
+def duck(tmp_path, monkeypatch):
+    """A ChatDB on a throwaway DuckDB file."""
+    pytest.importorskip('duckdb')
+    monkeypatch.setattr(chatdb, 'DUCKDB_PATH', str(tmp_path / 'test.duckdb'))
+    db = chatdb.ChatDB()
+    db.current_db_type = 'duckdb'
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """A ChatDB whose MongoDB client is mongomock, so no mongod is needed."""
+    mongomock = pytest.importorskip('mongomock')
+    monkeypatch.setattr(chatdb.pymongo, 'MongoClient', mongomock.MongoClient)
+    # mongomock has no explain command
+    monkeypatch.setattr(chatdb, 'EXPLAIN_BEFORE_EXECUTE', False)
+    db = chatdb.ChatDB()
+    db.current_db_type = 'mongo'
+    yield db
+    db.close()
@@ -0,0 +1,88 @@
+import _thread
+import threading
+import time
+
+import pytest
+
+import chatdb
+
+# never finishes on its own within a test run
+ENDLESS_QUERY = "SELECT count(*) FROM range(100000000000) t(a) WHERE a % 7 = 3"
+
+
+def wait_for_query(db):
+    while not db.active_queries:
+        time.sleep(0.01)
+    # let it get into execution
+    time.sleep(0.2)
+
+
+def test_ctrl_c_cancels_a_running_duckdb_query(duck, capsys):
+    def press_ctrl_c():
+        wait_for_query(duck)
+        _thread.interrupt_main()
+
+    threading.Thread(target=press_ctrl_c).start()
+    start = time.perf_counter()
+    duck.execute_query({'query': ENDLESS_QUERY, 'description': 'endless'}, 'endless', 'duckdb')
+    assert time.perf_counter() - start < 10
+    assert "Query cancelled" in capsys.readouterr().out
+    assert duck.active_queries == {}
+
+
+def test_duckdb_timeout_is_reported_as_a_timeout(duck):
+    with pytest.raises(chatdb.QueryTimeoutError):
+        duck.fetch_duckdb_summary(ENDLESS_QUERY, timeout_ms=200)
+    assert duck.active_queries == {}
+
+
+def test_cancelled_duckdb_query_is_not_a_timeout(duck):
+    errors = []
+
+    def run():
+        try:
+            duck.fetch_duckdb_summary(ENDLESS_QUERY, timeout_ms=60000)
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    wait_for_query(duck)
+    duck.cancel_active_queries()
+    worker.join(10)
+    assert not worker.is_alive()
+    assert len(errors) == 1 and not isinstance(errors[0], chatdb.QueryTimeoutError)
+
+
+def test_ctrl_c_kills_the_mongo_operation_before_forgetting_it(mongo, monkeypatch, capsys):
+    cancelled = []
+
+    def interrupted(*args):
+        raise KeyboardInterrupt
+
+    def cancel_query(token):
+        # the token must still be registered, killOp finds the operation by it
+        cancelled.append(mongo.active_queries.pop(token, None))
+
+    monkeypatch.setattr(mongo, 'read_mongo_summary', interrupted)
+    monkeypatch.setattr(mongo, 'cancel_query', cancel_query)
+    mongo.execute_query({'query': {'type': 'find', 'filter': {}}, 'description': 'all'}, 'cars', 'mongo')
+    assert cancelled == [{'db_type': 'mongo'}]
+    assert "Query cancelled" in capsys.readouterr().out
+    assert mongo.active_queries == {}
+
+
+def test_interrupted_mysql_connection_is_disconnected_before_reuse():
+    calls = []
+
+    class Connection:
+        def disconnect(self):
+            calls.append('disconnect')
+
+        def close(self):
+            calls.append('close')
+
+    manager = chatdb.ConnectionManager()
+    manager.release_mysql(Connection())
+    manager.release_mysql(Connection(), discard=True)
+    assert calls == ['close', 'disconnect', 'close']
@@ -0,0 +1,23 @@
+from conftest import fixture_path
+
+
+def test_bare_dataset_name_only_probes_backends_in_use(duck, monkeypatch):
+    probed = []
+    load_catalog = duck.load_catalog
+
+    def spy(db_type):
+        probed.append(db_type)
+        return load_catalog(db_type)
+
+    monkeypatch.setattr(duck, 'load_catalog', spy)
+    # nothing listed yet: no backend is contacted at all
+    assert not duck.set_current_dataset('videogames')
+    assert probed == []
+
+    duck.upload_csv(fixture_path('sqldata/videogames.csv'), 'videogames', 'duckdb')
+    duck.current_dataset = None
+    probed.clear()
+    assert duck.set_current_dataset('videogames')
+    assert duck.current_db_type == 'duckdb'
+    assert set(probed) <= {'duckdb'}
+
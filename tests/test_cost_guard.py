@@ -0,0 +1,68 @@
+import pytest
+
+import chatdb
+from conftest import fixture_path
+
+
+@pytest.fixture
+def videogames(duck, monkeypatch):
+    duck.upload_csv(fixture_path('sqldata/videogames.csv'), 'videogames', 'duckdb')
+    # the fixture has ~16.6k rows, guard well below that
+    monkeypatch.setattr(chatdb, 'MAX_QUERY_ROWS', 1000)
+    return duck
+
+
+def run(db, sql):
+    return db.fetch_query_summary({'query': sql}, 'videogames', 'duckdb')
+
+
+def test_small_duckdb_aggregates_over_a_large_table_are_not_refused(videogames):
+    summary = run(videogames, "SELECT Genre, COUNT(*) AS count FROM videogames GROUP BY Genre")
+    assert summary['total'] == 12
+    assert summary['note'] is None
+    assert run(videogames, "SELECT AVG(Global_Sales) FROM videogames")['total'] == 1
+
+
+def test_large_duckdb_result_gets_a_limit(videogames):
+    summary = run(videogames, "SELECT * FROM videogames")
+    assert summary['total'] == chatdb.GUARD_LIMIT
+    assert 'limited' in summary['note']
+
+
+def test_large_duckdb_grouping_is_refused(videogames):
+    with pytest.raises(chatdb.QueryRefusedError):
+        run(videogames, "SELECT Name, COUNT(*) FROM videogames GROUP BY Name")
+
+
+def test_sql_guard_limits_plain_selects_and_refuses_aggregates():
+    db = chatdb.ChatDB()
+    plan = {'rows': chatdb.MAX_QUERY_ROWS + 1, 'indexes': []}
+    limited, note = db.guard_query({'query': "SELECT * FROM t;"}, plan, 'sql')
+    assert limited['query'] == f"SELECT * FROM t LIMIT {chatdb.GUARD_LIMIT}"
+    assert note
+    with pytest.raises(chatdb.QueryRefusedError):
+        db.guard_query({'query': "SELECT g, SUM(x) FROM t GROUP BY g"}, plan, 'sql')
+    assert db.guard_query({'query': "SELECT * FROM t"}, dict(plan, rows=10), 'sql') == ({'query': "SELECT * FROM t"}, None)
+
+
+def test_guard_runs_queries_that_already_have_a_small_limit():
+    db = chatdb.ChatDB()
+    plan = {'rows': chatdb.MAX_QUERY_ROWS + 1, 'indexes': []}
+    for sql in ("SELECT * FROM t ORDER BY x DESC LIMIT 5;", "SELECT g, SUM(x) FROM t GROUP BY g LIMIT 10, 5"):
+        assert db.guard_query({'query': sql}, plan, 'sql') == ({'query': sql}, None)
+    find = {'query': {'type': 'find', 'filter': {}, 'limit': 5}}
+    assert db.guard_query(find, plan, 'mongo') == (find, None)
+    aggregate = {'query': {'type': 'aggregate', 'pipeline': [{'$sort': {'x': -1}}, {'$limit': 5}]}}
+    assert db.guard_query(aggregate, plan, 'mongo') == (aggregate, None)
+    # a limit above GUARD_LIMIT is still guarded
+    with pytest.raises(chatdb.QueryRefusedError):
+        db.guard_query({'query': f"SELECT * FROM t LIMIT {chatdb.GUARD_LIMIT + 1}"}, plan, 'sql')
+
+
+def test_mongo_guard_limits_unlimited_finds():
+    db = chatdb.ChatDB()
+    plan = {'rows': chatdb.MAX_QUERY_ROWS + 1, 'indexes': []}
+    limited, _ = db.guard_query({'query': {'type': 'find', 'filter': {}}}, plan, 'mongo')
+    assert limited['query']['limit'] == chatdb.GUARD_LIMIT
+    with pytest.raises(chatdb.QueryRefusedError):
+        db.guard_query({'query': {'type': 'aggregate', 'pipeline': []}}, plan, 'mongo')
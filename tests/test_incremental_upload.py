@@ -0,0 +1,192 @@
+import pandas as pd
+import pytest
+
+import chatdb
+from conftest import fixture_path
+
+
+@pytest.fixture
+def files(tmp_path):
+    """The first 50 videogames, and an update: 3 changed sales, 1 longer name, 2 new games."""
+    base = pd.read_csv(fixture_path('sqldata/videogames.csv')).head(50)
+    update = base.copy()
+    update.loc[:2, 'Global_Sales'] = [101.5, 2.5, 3.5]
+    update.loc[3, 'Name'] = 'x' * 300
+    new_games = base.tail(2).assign(Rank=[9001, 9002], Genre='Party', Year=[2020.5, 2021])
+    update = pd.concat([update, new_games])
+    paths = {'base': tmp_path / 'base.csv', 'update': tmp_path / 'update.csv'}
+    base.to_csv(paths['base'], index=False)
+    update.to_csv(paths['update'], index=False)
+    return {name: str(path) for name, path in paths.items()}
+
+
+def upload(db, path, db_type, mode, key=None):
+    df = db.clean_dataframe(pd.read_csv(path))
+    return db.upload_incremental(df, 'videogames', db_type, mode, key)
+
+
+def test_duckdb_upsert_writes_only_new_and_changed_rows(duck, files):
+    duck.upload_csv(files['base'], 'videogames', 'duckdb')
+    assert upload(duck, files['update'], 'duckdb', 'upsert', ['Rank']) == \
+        {'inserted': 2, 'updated': 4, 'unchanged': 46, 'skipped': 0}
+    # the same file again changes nothing
+    assert upload(duck, files['update'], 'duckdb', 'upsert', ['Rank'])['unchanged'] == 52
+
+    con = duck.connect_duckdb()
+    try:
+        assert con.execute("SELECT count(*) FROM videogames").fetchone()[0] == 52
+        assert con.execute('SELECT "Global_Sales" FROM videogames WHERE "Rank" = 1').fetchone()[0] == 101.5
+        # the fractional year needed a wider column than the first upload's BIGINT
+        assert con.execute('SELECT "Year" FROM videogames WHERE "Rank" = 9001').fetchone()[0] == 2020.5
+    finally:
+        con.close()
+
+
+def test_duckdb_append_skips_changed_rows(duck, files):
+    duck.upload_csv(files['base'], 'videogames', 'duckdb')
+    assert upload(duck, files['update'], 'duckdb', 'append', ['Rank']) == \
+        {'inserted': 2, 'updated': 0, 'unchanged': 46, 'skipped': 4}
+    # without a key a changed row can't be matched, so it is a new row
+    assert upload(duck, files['update'], 'duckdb', 'append')['inserted'] == 4
+
+
+def test_duckdb_upsert_updates_every_row_with_a_repeated_key(duck, files, tmp_path):
+    base = pd.read_csv(files['base'])
+    path = tmp_path / 'repeated.csv'
+    pd.concat([base, base.head(1)]).to_csv(path, index=False)
+    duck.upload_csv(str(path), 'videogames', 'duckdb')
+    upload(duck, files['update'], 'duckdb', 'upsert', ['Rank'])
+    con = duck.connect_duckdb()
+    try:
+        assert con.execute('SELECT "Global_Sales" FROM videogames WHERE "Rank" = 1').fetchall() == [(101.5,), (101.5,)]
+    finally:
+        con.close()
+
+
+def test_mongo_upsert(mongo, files, capsys):
+    mongo.upload_csv(files['base'], 'videogames', 'mongo')
+    assert upload(mongo, files['update'], 'mongo', 'upsert', ['Rank']) == \
+        {'inserted': 2, 'updated': 4, 'unchanged': 46, 'skipped': 0}
+    # the whole upload, with the profiling and indexing after the write
+    mongo.upload_csv(files['update'], 'videogames', 'mongo', mode='upsert', key=['Rank'], auto_index=True)
+    out = capsys.readouterr().out
+    assert 'failed' not in out and 'Error' not in out
+    assert 'Successfully uploaded' in out
+    collection = mongo.connect_mongo()['videogames']
+    assert collection.count_documents({}) == 52
+    assert collection.find_one({'Rank': 1})['Global_Sales'] == 101.5
+    assert upload(mongo, files['update'], 'mongo', 'upsert', ['Rank'])['unchanged'] == 52
+
+
+class FakeCursor:
+    """Records the statements a MySQL writer sends and answers DESCRIBE from `columns`."""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.statements = []
+        self.rows = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        self.rows = [(name, sql_type) for name, sql_type in self.columns.items()] if statement.startswith('DESCRIBE') else []
+
+    def executemany(self, statement, rows):
+        self.statements.append(statement)
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, *args, **kwargs):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TrackingConnection(FakeConnection):
+    """A pooled connection that knows whether it holds uncommitted writes."""
+
+    def __init__(self, columns, pool):
+        super().__init__(FakeCursor(columns))
+        self.pool = pool
+        self.uncommitted = False
+        execute = self._cursor.execute
+
+        def tracked(statement, params=None):
+            if statement.startswith('CREATE INDEX'):
+                # MySQL would block this DDL on the metadata lock of the other transaction
+                assert not any(other.uncommitted for other in self.pool if other is not self), statement
+            if statement.startswith(('INSERT', 'UPDATE')):
+                self.uncommitted = True
+            execute(statement, params)
+        self._cursor.execute = tracked
+        self._cursor.executemany = tracked
+
+    def commit(self):
+        self.uncommitted = False
+
+
+def upload_frames(db, files):
+    base = db.add_row_hashes(db.clean_dataframe(pd.read_csv(files['base'])))
+    update = db.add_row_hashes(db.clean_dataframe(pd.read_csv(files['update'])))
+    # DESCRIBE's view of the table a replace upload of base creates
+    create = db.generate_create_table_stmt(base, 'videogames')
+    columns = {}
+    for column in create[create.index('(') + 1:-1].split(', `'):
+        name, sql_type = column.strip('`').split('` ', 1)
+        columns[name] = sql_type.lower() if not sql_type.startswith('ENUM') else 'enum' + sql_type[4:]
+    return update, columns
+
+
+def test_mysql_upsert_widens_exact_columns_and_needs_no_unique_index(files, monkeypatch):
+    db = chatdb.ChatDB()
+    update, columns = upload_frames(db, files)
+    cursor = FakeCursor(columns)
+    monkeypatch.setattr(db, 'connect_mysql', lambda **options: FakeConnection(cursor))
+
+    db.write_incremental_sql(update.tail(2), update.head(4), 'videogames', ['Rank'], existing_dataset=True)
+    sql = '\n'.join(cursor.statements)
+    alter = next(statement for statement in cursor.statements if statement.startswith('ALTER TABLE'))
+    assert "MODIFY `Name` VARCHAR(300)" in alter
+    # members stay sorted, MySQL orders an ENUM column by member position
+    assert "Genre` ENUM('Action', 'Fighting', 'Misc', 'Party', 'Platform'," in alter
+    assert "MODIFY `Global_Sales` DECIMAL(5,2)" in alter
+    assert "UNIQUE" not in sql and "ON DUPLICATE KEY" not in sql
+    assert "UPDATE videogames t JOIN videogames_changes c ON t.`Rank` <=> c.`Rank`" in sql
+    # a YEAR column is still numeric to the query generators
+    assert columns['Year'] == 'year'
+    assert 'Year' in db.get_schema('videogames', 'sql')['numeric']
+
+
+def test_mysql_upsert_builds_the_key_index_before_writing_rows(files, monkeypatch):
+    db = chatdb.ChatDB()
+    update, columns = upload_frames(db, files)
+    pool = []
+
+    def connect(**options):
+        pool.append(TrackingConnection(columns, pool))
+        return pool[-1]
+    monkeypatch.setattr(db, 'connect_mysql', connect)
+
+    db.write_incremental_sql(update.tail(2), update.head(4), 'videogames', ['Rank'], existing_dataset=True)
+    statements = [(cnx, statement) for cnx in pool for statement in cnx._cursor.statements]
+    writer = next(cnx for cnx, statement in statements if statement.startswith('INSERT INTO videogames '))
+    indexer = next(cnx for cnx, statement in statements if statement.startswith('CREATE INDEX'))
+    assert writer is not indexer
+    assert not writer.uncommitted
+
+
+def test_conflicting_column_types_are_refused_before_writing():
+    db = chatdb.ChatDB()
+    cursor = FakeCursor({})
+    with pytest.raises(ValueError):
+        db.widen_sql_columns(cursor, 't', pd.DataFrame({'n': ['not a number']}), {'n': 'int'})
+    assert cursor.statements == []
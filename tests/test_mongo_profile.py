@@ -0,0 +1,18 @@
+import math
+
+
+def test_profile_falls_back_to_counting_types_on_the_client(mongo):
+    # mongomock rejects the $objectToArray/$type pipeline, like servers too old for it
+    collection = mongo.connect_mongo()['people']
+    collection.insert_many([
+        {'name': 'a', 'age': 30, 'score': 1.5},
+        {'name': 'b', 'age': 2**40, 'score': math.nan},
+        {'name': 'c', 'age': 'unknown'},
+        {'name': 'd', 'age': None, 'score': 2.5},
+    ])
+    profile = mongo.profile_mongo_schema(collection)
+    assert profile['name'] == {'types': {'string': 4}, 'null_ratio': 0, 'type': 'string'}
+    assert profile['age']['types'] == {'int': 1, 'long': 1, 'string': 1, 'null': 1}
+    assert profile['age']['type'] == 'mixed(int, long, string)'
+    assert profile['score']['type'] == 'double'
+    assert profile['score']['null_ratio'] == 0.5
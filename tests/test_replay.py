@@ -0,0 +1,44 @@
+import threading
+import time
+
+import chatdb
+
+QUERY_SECONDS = 0.05
+
+
+def slow_backend(db, monkeypatch):
+    # every query takes QUERY_SECONDS, the highest number running at once is recorded
+    running = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def fetch(query, dataset_name, db_type, timeout_ms):
+        with lock:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        time.sleep(QUERY_SECONDS)
+        with lock:
+            running['now'] -= 1
+
+    monkeypatch.setattr(db, 'fetch_uncached', fetch)
+    return running
+
+
+def test_closed_loop_runs_exactly_concurrency_queries_and_times_them_from_start(monkeypatch):
+    db = chatdb.ChatDB()
+    running = slow_backend(db, monkeypatch)
+    entries = [{'type': 'where', 'query': 'SELECT 1', 'dataset': 't', 'db_type': 'duckdb'}]
+    outcomes, _ = db.replay_workload(entries, concurrency=3, count=12)
+    assert len(outcomes) == 12
+    assert running['max'] == 3
+    # no time spent queued behind the workers is counted
+    assert max(latency for _, latency, _ in outcomes) < QUERY_SECONDS * 1.8
+
+
+def test_open_loop_counts_queueing_behind_the_schedule(monkeypatch):
+    db = chatdb.ChatDB()
+    slow_backend(db, monkeypatch)
+    entries = [{'type': 'where', 'query': 'SELECT 1', 'dataset': 't', 'db_type': 'duckdb'}]
+    # 1 worker, twice the rate it can keep up with: later queries wait and that shows
+    outcomes, _ = db.replay_workload(entries, concurrency=1, rate=2 / QUERY_SECONDS, count=8)
+    assert all(outcome == 'ok' for _, _, outcome in outcomes)
+    assert max(latency for _, latency, _ in outcomes) > QUERY_SECONDS * 2
@@ -0,0 +1,52 @@
+import pandas as pd
+
+import chatdb
+from conftest import fixture_path
+
+
+def test_sql_key_ignores_whitespace_and_trailing_semicolon():
+    db = chatdb.ChatDB()
+    key = db.result_cache_key({'query': "SELECT *\n  FROM  t;"}, 't', 'duckdb')
+    assert key == db.result_cache_key({'query': "SELECT * FROM t"}, 't', 'duckdb')
+    assert key != db.result_cache_key({'query': "SELECT * FROM t"}, 't', 'sql')
+    assert key != db.result_cache_key({'query': "SELECT * FROM t"}, 'u', 'duckdb')
+
+
+def test_mongo_key_ignores_filter_order_but_not_sort_order():
+    db = chatdb.ChatDB()
+
+    def key(match, sort):
+        query = {'type': 'aggregate', 'pipeline': [{'$match': match}, {'$sort': sort}]}
+        return db.result_cache_key({'query': query}, 'games', 'mongo')
+
+    assert key({'a': 1, 'b': 2}, {'x': 1, 'y': -1}) == key({'b': 2, 'a': 1}, {'x': 1, 'y': -1})
+    assert key({'a': 1, 'b': 2}, {'x': 1, 'y': -1}) != key({'a': 1, 'b': 2}, {'y': -1, 'x': 1})
+
+
+def test_bumping_the_version_changes_the_key():
+    db = chatdb.ChatDB()
+    query = {'query': "SELECT * FROM t"}
+    before = db.result_cache_key(query, 't', 'duckdb')
+    other = db.result_cache_key(query, 'u', 'duckdb')
+    db.bump_dataset_version('t', 'duckdb')
+    assert db.result_cache_key(query, 't', 'duckdb') != before
+    # other datasets keep their cached results
+    assert db.result_cache_key(query, 'u', 'duckdb') == other
+
+
+def test_reupload_invalidates_cached_results(duck, tmp_path, monkeypatch):
+    monkeypatch.setattr(chatdb, 'EXPLAIN_BEFORE_EXECUTE', False)
+    games = pd.read_csv(fixture_path('sqldata/videogames.csv'))
+    path = tmp_path / 'games.csv'
+    query = {'query': "SELECT count(*) AS n FROM videogames"}
+
+    games.head(50).to_csv(path, index=False)
+    duck.upload_csv(str(path), 'videogames', 'duckdb')
+    first = duck.fetch_query_summary(query, 'videogames', 'duckdb')
+    assert first['head'] == [(50,)]
+    assert duck.fetch_query_summary(query, 'videogames', 'duckdb') is first
+
+    games.head(20).to_csv(path, index=False)
+    duck.upload_csv(str(path), 'videogames', 'duckdb')
+    second = duck.fetch_query_summary(query, 'videogames', 'duckdb')
+    assert second['head'] == [(20,)]
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+import chatdb
+from conftest import fixture_path
+
+
+@pytest.fixture
+def files(tmp_path):
+    """The first 50 videogames and the next 30, as two versions of one dataset."""
+    games = pd.read_csv(fixture_path('sqldata/videogames.csv'))
+    paths = {'old': tmp_path / 'old.csv', 'new': tmp_path / 'new.csv'}
+    games.head(50).to_csv(paths['old'], index=False)
+    games.iloc[50:80].to_csv(paths['new'], index=False)
+    return {name: str(path) for name, path in paths.items()}
+
+
+def duckdb_tables(db):
+    con = db.connect_duckdb()
+    try:
+        return {name: con.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0]
+                for (name,) in con.execute("SHOW TABLES").fetchall()}
+    finally:
+        con.close()
+
+
+def failing(method):
+    def run(*args, **kwargs):
+        method(*args, **kwargs)
+        raise RuntimeError('disk full')
+    return run
+
+
+def test_failed_upload_keeps_the_old_data(duck, files, monkeypatch, capsys):
+    duck.upload_csv(files['old'], 'videogames', 'duckdb')
+    monkeypatch.setattr(duck, 'upload_to_duckdb', failing(duck.upload_to_duckdb))
+    duck.upload_csv(files['new'], 'videogames', 'duckdb')
+    assert 'Error uploading data: disk full' in capsys.readouterr().out
+    tables = duckdb_tables(duck)
+    assert tables['videogames'] == 50
+    assert 'videogames' + chatdb.STAGING_SUFFIX not in tables
+
+
+def test_index_failure_still_swaps(duck, files, monkeypatch, capsys):
+    duck.upload_csv(files['old'], 'videogames', 'duckdb')
+
+    def build_indexes(*args, **kwargs):
+        raise RuntimeError('index too long')
+    monkeypatch.setattr(duck, 'build_indexes', build_indexes)
+    duck.upload_csv(files['new'], 'videogames', 'duckdb', auto_index=True)
+    out = capsys.readouterr().out
+    assert 'Could not build indexes: index too long' in out
+    assert 'Error uploading data' not in out
+    assert duckdb_tables(duck)['videogames'] == 30
+
+
+def test_failure_after_the_swap_is_not_an_upload_failure(duck, files, monkeypatch, capsys):
+    duck.upload_csv(files['old'], 'videogames', 'duckdb')
+    dropped = []
+    monkeypatch.setattr(duck, 'save_column_stats', failing(lambda *args: None))
+    monkeypatch.setattr(duck, 'drop_staging', lambda *args: dropped.append(args))
+    duck.upload_csv(files['new'], 'videogames', 'duckdb')
+    out = capsys.readouterr().out
+    assert 'Error uploading data' not in out
+    assert 'videogames was uploaded, but finishing the upload failed: disk full' in out
+    assert dropped == []
+    assert duckdb_tables(duck)['videogames'] == 30
+
+
+@pytest.mark.parametrize('name', ['games' + chatdb.STAGING_SUFFIX, 'games' + chatdb.RETIRED_SUFFIX,
+                                  chatdb.COLUMN_STATS_TABLE])
+def test_reserved_names_are_refused(duck, files, name, capsys):
+    duck.upload_csv(files['old'], name, 'duckdb')
+    assert 'is reserved' in capsys.readouterr().out
+    assert name not in duckdb_tables(duck)
+
+
+def test_mongo_swap_keeps_the_staging_indexes(mongo, files, capsys):
+    mongo.upload_csv(files['old'], 'videogames', 'mongo')
+    mongo.upload_csv(files['new'], 'videogames', 'mongo', auto_index=True)
+    out = capsys.readouterr().out
+    # the profiling, indexing and cleanup after the swap all ran
+    assert 'failed' not in out and 'Error' not in out and 'Could not' not in out
+    assert 'Successfully uploaded' in out
+    db = mongo.connect_mongo()
+    assert db['videogames'].count_documents({}) == 30
+    assert 'videogames' + chatdb.STAGING_SUFFIX not in db.list_collection_names()
+    assert len(db['videogames'].index_information()) > 1